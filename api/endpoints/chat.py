@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Dict, Any
+import asyncio
 import json
 
 from models.chat import ChatRequest, ChatResponse, TokenCost
@@ -40,7 +41,7 @@ async def chat(request: ChatRequest):
         
         # 如果指定了对话ID，检查对话是否存在
         if request.conversation_id:
-            conversation = conversation_service.get_conversation(request.conversation_id)
+            conversation = await asyncio.to_thread(conversation_service.get_conversation, request.conversation_id)
             if not conversation:
                 raise HTTPException(status_code=404, detail=f"对话 {request.conversation_id} 不存在")
         
@@ -95,7 +96,7 @@ async def conversation_chat(request: ConversationChatRequest):
         api_logger.info(f"请求体: {json.dumps(request.dict(), ensure_ascii=False)}")
         
         # 检查对话是否存在
-        conversation = conversation_service.get_conversation(request.conversation_id)
+        conversation = await asyncio.to_thread(conversation_service.get_conversation, request.conversation_id)
         if not conversation:
             raise HTTPException(status_code=404, detail=f"对话 {request.conversation_id} 不存在")
         
@@ -15,7 +15,7 @@ router = APIRouter()
 api_logger = get_logger("api")
 
 @router.post("", response_model=Conversation, summary="创建新对话")
-async def create_conversation(request: ConversationCreate):
+def create_conversation(request: ConversationCreate):
     """
     创建新的对话
     
@@ -53,7 +53,7 @@ async def create_conversation(request: ConversationCreate):
         raise HTTPException(status_code=500, detail=f"创建对话失败: {str(e)}")
 
 @router.get("/conversations", response_model=ConversationList, summary="获取对话列表")
-async def get_conversations(page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100)):
+def get_conversations(page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100)):
     """
     获取对话列表
     
@@ -73,7 +73,7 @@ async def get_conversations(page: int = Query(1, ge=1), page_size: int = Query(2
         raise HTTPException(status_code=500, detail=f"获取对话列表失败: {str(e)}")
 
 @router.get("/conversations/{conversation_id}", response_model=Conversation, summary="获取对话详情")
-async def get_conversation(conversation_id: int):
+def get_conversation(conversation_id: int):
     """
     获取对话详情
     
@@ -99,7 +99,7 @@ async def get_conversation(conversation_id: int):
         raise HTTPException(status_code=500, detail=f"获取对话详情失败: {str(e)}")
 
 @router.put("/conversations/{conversation_id}", response_model=Conversation, summary="更新对话")
-async def update_conversation(conversation_id: int, update_data: ConversationUpdate):
+def update_conversation(conversation_id: int, update_data: ConversationUpdate):
     """
     更新对话信息
     
@@ -133,7 +133,7 @@ async def update_conversation(conversation_id: int, update_data: ConversationUpd
         raise HTTPException(status_code=500, detail=f"更新对话失败: {str(e)}")
 
 @router.delete("/conversations/{conversation_id}", summary="删除对话")
-async def delete_conversation(conversation_id: int):
+def delete_conversation(conversation_id: int):
     """
     删除对话及其所有消息和记忆
     
@@ -156,11 +156,12 @@ async def delete_conversation(conversation_id: int):
         raise HTTPException(status_code=500, detail=f"删除对话失败: {str(e)}")
 
 @router.get("/conversations/{conversation_id}/messages", response_model=ConversationMessageList, summary="获取对话消息")
-async def get_conversation_messages(
+def get_conversation_messages(
     conversation_id: int,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    sort_asc: bool = Query(False, description="是否按时间升序排序（从旧到新）")
+    sort_asc: bool = Query(False, description="是否按时间升序排序（从旧到新）"),
+    before_id: Optional[int] = Query(None, ge=1, description="游标分页：只返回ID小于该值的消息，指定时忽略page")
 ):
     """
     获取对话消息历史
@@ -169,6 +170,7 @@ async def get_conversation_messages(
     - **page**: 页码，从1开始
     - **page_size**: 每页数量，默认20
     - **sort_asc**: 是否按时间升序排序，默认false（从新到旧）
+    - **before_id**: 游标分页，传入上一页最旧一条消息的ID加载更早的消息，深翻页不会变慢
     
     返回分页的对话消息列表
     """
@@ -179,7 +181,8 @@ async def get_conversation_messages(
             conversation_id, 
             page, 
             page_size,
-            sort_asc
+            sort_asc,
+            before_id
         )
         
         if result["total"] == 0 and page == 1:
@@ -198,7 +201,7 @@ async def get_conversation_messages(
         raise HTTPException(status_code=500, detail=f"获取对话消息失败: {str(e)}")
 
 @router.delete("/conversations/{conversation_id}/messages", summary="清除对话消息")
-async def clear_conversation_messages(conversation_id: int, request: MemoryClearRequest):
+def clear_conversation_messages(conversation_id: int, request: MemoryClearRequest):
     """
     清除对话的所有消息和记忆
     
@@ -228,7 +231,7 @@ async def clear_conversation_messages(conversation_id: int, request: MemoryClear
         raise HTTPException(status_code=500, detail=f"清除对话消息失败: {str(e)}")
 
 @router.put("/{conversation_id}/files", response_model=Conversation, summary="更新对话关联的文件")
-async def update_conversation_files(
+def update_conversation_files(
     conversation_id: int = Path(..., description="对话ID"),
     files: List[str] = Body(..., description="文件ID列表")
 ):
@@ -1,62 +1,93 @@
 import os
 import yaml
 import json
-from typing import Dict, Any, Optional, Union, List
-from pydantic import Field, model_validator
-from pydantic_settings import BaseSettings
+import logging
+import mmap
+from dataclasses import make_dataclass
+from pathlib import Path
+from typing import ClassVar, Dict, Any, Optional, Union, List
+from pydantic import Field, PrivateAttr, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# 配置模块日志记录器（utils.logger 依赖本模块，这里不能反向导入）
+_log = logging.getLogger("neko.config")
 
 # 配置文件路径
-CONFIG_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
-CONFIG_EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml.example")
+_MODULE_DIR = Path(__file__).resolve().parent.parent
+CONFIG_FILE_PATH = _MODULE_DIR / "config.yaml"
+CONFIG_EXAMPLE_PATH = _MODULE_DIR / "config.yaml.example"
+CONFIG_JSON_PATH = _MODULE_DIR / "config.json"
+# 解析后的 config.yaml 的 JSON 缓存，按源文件 mtime 和大小校验
+CONFIG_CACHE_PATH = _MODULE_DIR / "config.yaml.cache"
+
+# 优先使用 libyaml 实现的 C 解析器
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# 超过该大小（字节）的配置文件使用 mmap 读取
+_MMAP_THRESHOLD = 64 * 1024
+
+# 缺失配置项的占位标记
+_SENTINEL = object()
+# Config.get 缓存中表示"路径不存在"的标记
+_MISSING = object()
+
+# 点号路径拆分结果缓存
+_split_cache: Dict[str, List[str]] = {}
+
+def _split_key(key: str) -> List[str]:
+    """拆分点号路径，结果按原始字符串缓存"""
+    parts = _split_cache.get(key)
+    if parts is None:
+        parts = _split_cache[key] = key.split(".")
+    return parts
+
+# 本进程内已确认存在的目录
+_known_dirs: set = set()
+
+def ensure_dirs(*paths: str) -> None:
+    """批量创建目录，已确认存在的目录不再重复 stat；设置 NEKO_SKIP_MAKEDIRS 时跳过（只读根文件系统）"""
+    if os.environ.get("NEKO_SKIP_MAKEDIRS"):
+        return
+    for path in paths:
+        if not path or path in _known_dirs:
+            continue
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+        _known_dirs.add(path)
 
 class Config:
-    _instance = None
+    """config.yaml 原始配置的点号路径访问视图，全局实例通过 get_config() 获取"""
     _config_data = {}
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(Config, cls).__new__(cls)
-            cls._instance._load_config()
-        return cls._instance
+    _cache: Dict[str, Any] = {}
 
     def _load_config(self):
-        """从 config.yaml 加载配置"""
-        try:
-            if os.path.exists(CONFIG_FILE_PATH):
-                with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-                    self._config_data = yaml.safe_load(f) or {}
-            else:
-                # 如果配置文件不存在，尝试从示例配置创建
-                if os.path.exists(CONFIG_EXAMPLE_PATH):
-                    with open(CONFIG_EXAMPLE_PATH, 'r', encoding='utf-8') as f:
-                        self._config_data = yaml.safe_load(f) or {}
-                    # 保存为实际配置文件
-                    with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-                        yaml.dump(self._config_data, f, default_flow_style=False, allow_unicode=True)
-                else:
-                    self._config_data = {}
-                    print("警告: 未找到配置文件或示例配置文件")
-        except Exception as e:
-            print(f"加载配置文件时出错: {e}")
-            self._config_data = {}
+        """复用 Settings 单例已加载的原始配置，不再重复读取文件"""
+        self._cache = {}
+        self._config_data = Settings.get_instance()._raw_config
 
     def get(self, key: str, default: Any = None) -> Any:
         """获取配置项，支持使用点号访问嵌套配置"""
-        if "." in key:
-            parts = key.split(".")
-            current = self._config_data
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    return default
-            return current
-        return self._config_data.get(key, default)
+        value = self._cache.get(key, _SENTINEL)
+        if value is _SENTINEL:
+            value = self._resolve(key)
+            self._cache[key] = value
+        return default if value is _MISSING else value
+
+    def _resolve(self, key: str) -> Any:
+        """沿点号路径遍历配置字典，找不到时返回 _MISSING"""
+        if "." not in key:
+            return self._config_data.get(key, _MISSING)
+        current = self._config_data
+        for part in _split_key(key):
+            if isinstance(current, dict) and part in current:
+                current = current[part]
+            else:
+                return _MISSING
+        return current
 
     def set(self, key: str, value: Any) -> None:
         """设置配置项，支持使用点号设置嵌套配置"""
         if "." in key:
-            parts = key.split(".")
+            parts = _split_key(key)
             current = self._config_data
             for i, part in enumerate(parts[:-1]):
                 if part not in current:
@@ -65,6 +96,7 @@ class Config:
             current[parts[-1]] = value
         else:
             self._config_data[key] = value
+        self._cache.clear()
 
     def save(self) -> bool:
         """保存配置到文件"""
@@ -73,7 +105,7 @@ class Config:
                 yaml.dump(self._config_data, f, default_flow_style=False, allow_unicode=True)
             return True
         except Exception as e:
-            print(f"保存配置文件时出错: {e}")
+            _log.warning("保存配置文件时出错: %s", e)
             return False
 
     # 便捷方法，用于获取特定配置
@@ -90,14 +122,183 @@ class Config:
 
     # 添加其他便捷方法...
 
-# 创建全局配置实例
-config = Config()
+# 配置字段映射表: (Settings属性名, config.yaml中的嵌套路径, 默认值)
+_FIELD_MAP = [
+    # API配置
+    ("API_KEY", ("api", "key"), ""),
+    ("API_BASE_URL", ("api", "base_url"), "https://api.openai.com/v1"),
+    ("API_TIMEOUT", ("api", "timeout"), 30),
+    ("API_AUTH_ENABLED", ("api", "auth_enabled"), True),
+    ("API_RATE_LIMIT", ("api", "rate_limit"), 60),
+    # 模型配置
+    ("MODEL_NAME", ("model", "name"), "gpt-3.5-turbo"),
+    ("MODEL_TEMPERATURE", ("model", "temperature"), 0.7),
+    ("MODEL_MAX_TOKENS", ("model", "max_tokens"), 4096),
+    ("MODEL_TOP_P", ("model", "top_p"), 0.9),
+    ("MODEL_FREQUENCY_PENALTY", ("model", "frequency_penalty"), 0),
+    ("MODEL_PRESENCE_PENALTY", ("model", "presence_penalty"), 0),
+    ("MODEL_INPUT_PRICE_PER_1K", ("model", "input_price_per_1k"), 0.001),
+    ("MODEL_OUTPUT_PRICE_PER_1K", ("model", "output_price_per_1k"), 0.002),
+    # 嵌入模型配置
+    ("EMBEDDING_MODEL", ("embedding", "model"), "text-embedding-ada-002"),
+    ("EMBEDDING_BASE_URL", ("embedding", "base_url"), ""),
+    ("EMBEDDING_API_KEY", ("embedding", "api_key"), ""),
+    ("EMBEDDING_TIMEOUT", ("embedding", "timeout"), 30),
+    ("EMBEDDING_DIMENSION", ("embedding", "dimension"), 1024),
+    ("EMBEDDING_BATCH_SIZE", ("embedding", "batch_size"), 64),
+    ("EMBEDDING_ENCODING_FORMAT", ("embedding", "encoding_format"), "base64"),
+    ("EMBEDDING_CONCURRENCY", ("embedding", "concurrency"), 4),
+    ("EMBEDDING_CACHE_SIZE", ("embedding", "cache_size"), 8192),
+    # 重排序配置
+    ("RERANK_ENABLED", ("rerank", "enabled"), True),
+    ("RERANK_MODEL", ("rerank", "model"), "BAAI/bge-reranker-v2-m3"),
+    ("RERANK_TOP_N", ("rerank", "top_n"), 5),
+    ("RERANK_CHUNK_SIZE", ("rerank", "chunk_size"), 64),
+    ("RERANK_CONCURRENCY", ("rerank", "concurrency"), 2),
+    # 网络搜索配置
+    ("WEB_SEARCH_ENABLED", ("web_search", "enabled"), False),
+    ("WEB_SEARCH_NUM_RESULTS", ("web_search", "num_results"), 5),
+    ("GOOGLE_API_KEY", ("web_search", "google", "api_key"), ""),
+    ("GOOGLE_CSE_ID", ("web_search", "google", "cse_id"), ""),
+    ("SERPAPI_API_KEY", ("web_search", "serpapi", "api_key"), ""),
+    # 检索配置
+    ("RETRIEVAL_GRAPH_RELATED_DEPTH", ("retrieval", "graph_related_depth"), 2),
+    ("RETRIEVAL_MIN_SIMILARITY", ("retrieval", "min_similarity"), 0.7),
+    ("RETRIEVAL_FILTER_SIMILARITY_THRESHOLD", ("retrieval", "filter_similarity_threshold"), 0.8),
+    ("RETRIEVAL_PAGE_SIZE", ("retrieval", "page_size"), 10),
+    ("RETRIEVAL_MAX_PAGE_SIZE", ("retrieval", "max_page_size"), 100),
+    # 存储配置
+    # Neo4j
+    ("NEO4J_URI", ("storage", "neo4j", "uri"), "bolt://localhost:7687"),
+    ("NEO4J_USER", ("storage", "neo4j", "user"), "neo4j"),
+    ("NEO4J_PASSWORD", ("storage", "neo4j", "password"), "neo4j"),
+    ("NEO4J_POOL_SIZE", ("storage", "neo4j", "pool_size"), 50),
+    # FAISS
+    ("FAISS_DIMENSION", ("storage", "faiss", "dimension"), 1024),
+    ("FAISS_INDEX_TYPE", ("storage", "faiss", "index_type"), "flat"),
+    ("FAISS_REBUILD_INDEX", ("storage", "faiss", "rebuild_index"), False),
+    ("FAISS_MAX_INDEX_SIZE", ("storage", "faiss", "max_index_size"), 1000000),
+    ("FAISS_INDEX_PATH", ("storage", "faiss", "index_path"), "data/faiss_index.pkl"),
+    ("FAISS_NLIST", ("storage", "faiss", "nlist"), 1024),
+    ("FAISS_NPROBE", ("storage", "faiss", "nprobe"), 16),
+    ("FAISS_PQ_M", ("storage", "faiss", "pq_m"), 32),
+    ("FAISS_HNSW_M", ("storage", "faiss", "hnsw_m"), 32),
+    ("FAISS_HNSW_EF_SEARCH", ("storage", "faiss", "hnsw_ef_search"), 64),
+    ("FAISS_HNSW_EF_CONSTRUCTION", ("storage", "faiss", "hnsw_ef_construction"), 200),
+    ("FAISS_SAVE_BATCH", ("storage", "faiss", "save_batch"), 100),
+    ("FAISS_SAVE_INTERVAL", ("storage", "faiss", "save_interval"), 30.0),
+    ("FAISS_MMAP", ("storage", "faiss", "mmap"), True),
+    ("FAISS_METRIC", ("storage", "faiss", "metric"), "ip"),
+    ("FAISS_THREADS", ("storage", "faiss", "threads"), 0),
+    ("FAISS_USE_GPU", ("storage", "faiss", "use_gpu"), False),
+    ("FAISS_QUERY_CACHE_SIZE", ("storage", "faiss", "query_cache_size"), 1024),
+    # MySQL
+    ("MYSQL_HOST", ("storage", "mysql", "host"), "localhost"),
+    ("MYSQL_PORT", ("storage", "mysql", "port"), 3306),
+    ("MYSQL_USER", ("storage", "mysql", "user"), "root"),
+    ("MYSQL_PASSWORD", ("storage", "mysql", "password"), "password"),
+    ("MYSQL_DATABASE", ("storage", "mysql", "database"), "neko_ai"),
+    ("MYSQL_POOL_SIZE", ("storage", "mysql", "pool_size"), 25),
+    ("MYSQL_POOL_OVERFLOW", ("storage", "mysql", "pool_overflow"), 10),
+    ("MYSQL_POOL_TIMEOUT", ("storage", "mysql", "pool_timeout"), 10.0),
+    ("MYSQL_COMPRESS_MESSAGES", ("storage", "mysql", "compress_messages"), False),
+    ("MYSQL_CONVERSATION_CACHE_TTL", ("storage", "mysql", "conversation_cache_ttl"), 0.0),
+    ("MYSQL_CONVERSATION_CACHE_SIZE", ("storage", "mysql", "conversation_cache_size"), 1024),
+    ("MYSQL_USE_PURE", ("storage", "mysql", "use_pure"), False),
+    # 多对话配置
+    ("DEFAULT_CONVERSATION_ID", ("conversation", "default_id"), "default"),
+    ("MAX_CONVERSATIONS", ("conversation", "max_conversations"), 100),
+    ("CONVERSATION_TITLE_MAX_LENGTH", ("conversation", "title_max_length"), 100),
+    ("CONVERSATION_CONTEXT_WINDOW_SIZE", ("conversation", "context_window_size"), 15),
+    ("USE_MYSQL_CONTEXT", ("conversation", "use_mysql_context"), True),
+    # 应用配置
+    ("APP_NAME", ("app", "name"), "Neko API"),
+    ("APP_VERSION", ("app", "version"), "1.1.0"),
+    ("APP_DESCRIPTION", ("app", "description"), "Neko AI助手API"),
+    ("DEBUG", ("app", "debug"), False),
+    ("APP_HOST", ("app", "host"), "localhost"),
+    ("APP_PORT", ("app", "port"), 9999),
+    # 文件路径
+    ("BASE_MD_PATH", ("paths", "base_md"), "base.md"),
+    ("PROMPT_MD_PATH", ("paths", "prompt_md"), "prompt.md"),
+    ("LOGS_DIR", ("paths", "logs_dir"), "logs"),
+    ("BACKUPS_DIR", ("paths", "backups_dir"), "backups"),
+    # 知识库配置
+    ("KNOWLEDGE_DIR", ("knowledge", "dir"), "knowledge/data"),
+    ("KNOWLEDGE_INDEX_PATH", ("knowledge", "index_path"), "knowledge/index/knowledge_index.pkl"),
+    ("KNOWLEDGE_CHUNK_SIZE", ("knowledge", "chunk_size"), 1000),
+    ("KNOWLEDGE_CHUNK_OVERLAP", ("knowledge", "chunk_overlap"), 200),
+    ("KNOWLEDGE_MAX_FILE_SIZE", ("knowledge", "max_file_size"), 10 * 1024 * 1024),
+    # 日志配置
+    ("LOG_LEVEL", ("logging", "level"), "INFO"),
+    ("LOG_CONSOLE", ("logging", "console"), True),
+    ("LOG_FILE", ("logging", "file"), True),
+    ("LOG_MAX_SIZE", ("logging", "max_size"), 10),
+    ("LOG_BACKUP_COUNT", ("logging", "backup_count"), 5),
+    ("LOG_REQUESTS", ("logging", "log_requests"), True),
+    # 用户信息
+    ("USER_USERNAME", ("user", "username"), "admin"),
+    ("USER_PASSWORD_HASH", ("user", "password_hash"), "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"),
+    ("USER_EMAIL", ("user", "email"), "admin@example.com"),
+    ("USER_ROLE", ("user", "role"), "admin"),
+    ("USER_ENABLED", ("user", "enabled"), True),
+    ("USER_CREATED_AT", ("user", "created_at"), "2023-01-01 00:00:00"),
+    # TTS配置
+    ("TTS_ENABLED", ("tts", "enabled"), False),
+    ("TTS_FISH_API_KEY", ("tts", "fish_api_key"), ""),
+    ("TTS_FISH_REFERENCE_ID", ("tts", "fish_reference_id"), ""),
+    ("TTS_MODEL", ("tts", "model"), "speech-1.6"),
+    ("TTS_DEVELOPER_ID", ("tts", "developer_id"), ""),
+    ("TTS_SPEED", ("tts", "speed"), 1.0),
+    ("TTS_VOLUME", ("tts", "volume"), 1.0),
+    ("TTS_PITCH", ("tts", "pitch"), 0.0),
+]
+
+# 字段顺序，与 FrozenSettings 的位置参数顺序一致
+_FIELD_ORDER = tuple(attr for attr, _, _ in _FIELD_MAP)
+
+# 只读的空字典，用于替代缺失的配置段（只调用 .get，不会被修改）
+_EMPTY: Dict[str, Any] = {}
+
+def _section(config: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """取出嵌套配置段，缺失或类型不对时返回 _EMPTY"""
+    value = config.get(key)
+    return value if isinstance(value, dict) else _EMPTY
+
+def _compile_flatten(field_map: List[tuple]):
+    """根据字段映射表生成直线式展开函数：每个配置段只取一次，键名和默认值以字面量内联，
+    按 _FIELD_ORDER 顺序返回值元组"""
+    lines = ["def _flatten(c):"]
+    sections = {(): "c"}
+    items = []
+    for attr, path, default in field_map:
+        prefix = path[:-1]
+        for depth in range(1, len(prefix) + 1):
+            sub = prefix[:depth]
+            if sub not in sections:
+                sections[sub] = f"s{len(sections)}"
+                lines.append(f"    {sections[sub]} = _section({sections[sub[:-1]]}, {sub[-1]!r})")
+        items.append(f"        {sections[prefix]}.get({path[-1]!r}, {default!r}),")
+    lines.append("    return (")
+    lines.extend(items)
+    lines.append("    )")
+    namespace = {"_section": _section}
+    exec("\n".join(lines), namespace)
+    return namespace["_flatten"]
+
+# 由 _FIELD_MAP 生成的配置展开函数
+_flatten_config = _compile_flatten(_FIELD_MAP)
 
 class Settings(BaseSettings):
-    """应用配置类，从config.yaml读取配置"""
+    """应用配置类，从config.yaml读取配置
+    
+    NEKO_ 前缀的同名环境变量（如 NEKO_MYSQL_HOST）优先于配置文件中的值。
+    """
+    
+    model_config = SettingsConfigDict(env_prefix="NEKO_")
     
     # 定义所有配置属性，确保有默认值
-    # 这些将在load_from_file方法中被覆盖
+    # 实际值在创建实例时由 _flatten_config 从原始配置中一次性解析
     
     # API配置
     API_KEY: str = ""
@@ -122,11 +323,17 @@ class Settings(BaseSettings):
     EMBEDDING_API_KEY: str = ""
     EMBEDDING_TIMEOUT: int = 30
     EMBEDDING_DIMENSION: int = 1024
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_ENCODING_FORMAT: str = "base64"
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_CACHE_SIZE: int = 8192
     
     # 重排序配置
     RERANK_ENABLED: bool = True
     RERANK_MODEL: str = "BAAI/bge-reranker-v2-m3"
     RERANK_TOP_N: int = 5
+    RERANK_CHUNK_SIZE: int = 64
+    RERANK_CONCURRENCY: int = 2
     
     # 其他配置属性...
     WEB_SEARCH_ENABLED: bool = False
@@ -152,6 +359,19 @@ class Settings(BaseSettings):
     FAISS_REBUILD_INDEX: bool = False
     FAISS_MAX_INDEX_SIZE: int = 1000000
     FAISS_INDEX_PATH: str = "data/faiss_index.pkl"
+    FAISS_NLIST: int = 1024
+    FAISS_NPROBE: int = 16
+    FAISS_PQ_M: int = 32
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_SAVE_BATCH: int = 100
+    FAISS_SAVE_INTERVAL: float = 30.0
+    FAISS_MMAP: bool = True
+    FAISS_METRIC: str = "ip"
+    FAISS_THREADS: int = 0
+    FAISS_USE_GPU: bool = False
+    FAISS_QUERY_CACHE_SIZE: int = 1024
     
     # MySQL配置
     MYSQL_HOST: str = "localhost"
@@ -159,7 +379,13 @@ class Settings(BaseSettings):
     MYSQL_USER: str = "root" 
     MYSQL_PASSWORD: str = "password"
     MYSQL_DATABASE: str = "neko_ai"
-    MYSQL_POOL_SIZE: int = 5
+    MYSQL_POOL_SIZE: int = 25
+    MYSQL_POOL_OVERFLOW: int = 10
+    MYSQL_POOL_TIMEOUT: float = 10.0
+    MYSQL_COMPRESS_MESSAGES: bool = False
+    MYSQL_CONVERSATION_CACHE_TTL: float = 0.0
+    MYSQL_CONVERSATION_CACHE_SIZE: int = 1024
+    MYSQL_USE_PURE: bool = False
     
     # 多对话配置
     DEFAULT_CONVERSATION_ID: str = "default"
@@ -214,180 +440,139 @@ class Settings(BaseSettings):
     TTS_SPEED: float = 1.0
     TTS_VOLUME: float = 1.0
     TTS_PITCH: float = 0.0
+
+    # 全局唯一实例
+    _instance: ClassVar[Optional["Settings"]] = None
+
+    # 原始配置字典，Config 复用同一份数据
+    _raw_config: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def get_instance(cls) -> "Settings":
+        """获取全局唯一的配置实例，配置文件只在首次调用时读取一次"""
+        if cls._instance is None:
+            cls._instance = cls.from_config(_load_config_dict())
+        return cls._instance
+
+    @classmethod
+    def settings_customise_sources(cls, settings_cls, init_settings, env_settings, dotenv_settings,
+                                   file_secret_settings):
+        # 配置文件中的值由 from_config 作为初始化参数传入，环境变量排在它之前，优先级更高
+        return env_settings, init_settings, dotenv_settings, file_secret_settings
+
+    @classmethod
+    def from_config(cls, raw_config: Dict[str, Any]) -> "Settings":
+        """从原始配置字典一次性解析全部字段，与环境变量合并后经过 pydantic 校验"""
+        instance = cls(**dict(zip(_FIELD_ORDER, _flatten_config(raw_config))))
+        instance._raw_config = raw_config
+        return instance
+
+    def freeze(self) -> "FrozenSettings":
+        """生成只读的 FrozenSettings 快照"""
+        return FrozenSettings(*(getattr(self, attr) for attr in _FIELD_ORDER))
+
+# 加载完成后的只读配置：frozen + slots，属性读取是槽位访问，不经过 pydantic
+FrozenSettings = make_dataclass(
+    "FrozenSettings",
+    [(attr, Settings.model_fields[attr].annotation) for attr in _FIELD_ORDER],
+    frozen=True,
+    slots=True,
+)
+FrozenSettings.__module__ = __name__
+
+def _read_yaml(path: Union[str, Path]) -> Any:
+    """解析 YAML 文件；超过 _MMAP_THRESHOLD 的大文件通过 mmap 交给解析器按需读取"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= _MMAP_THRESHOLD:
+            return yaml.load(f.read(), Loader=_YAML_LOADER)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return yaml.load(data, Loader=_YAML_LOADER)
+        finally:
+            data.close()
+
+def _read_yaml_cached(path: Path, cache_path: Path) -> Any:
+    """读取 YAML 配置；源文件未变化时直接加载 JSON 缓存，跳过 YAML 解析
     
-    def __init__(self, **kwargs):
-        """初始化配置类并自动加载配置文件"""
-        super().__init__(**kwargs)
-        self.load_from_file()
+    缓存只保存纯数据（不用 pickle，缓存文件被篡改也不会执行代码）；配置中有 JSON 无法原样表示的值
+    （日期、非字符串键等）时不写缓存。
+    """
+    st = os.stat(path)
+    key = [st.st_mtime_ns, st.st_size]
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["data"]
+    except Exception:
+        # 缓存缺失或损坏时重新解析
+        pass
+
+    data = _read_yaml(path)
+    try:
+        text = json.dumps({"key": key, "data": data}, ensure_ascii=False)
+        if json.loads(text)["data"] != data:
+            return data
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except (TypeError, ValueError, OSError) as e:
+        _log.debug("写入配置缓存失败: %s", e)
+    return data
+
+def _load_yaml_config() -> Any:
+    """读取 config.yaml，不存在时从示例配置创建"""
+    try:
+        return _read_yaml_cached(CONFIG_FILE_PATH, CONFIG_CACHE_PATH)
+    except FileNotFoundError:
+        config = _read_yaml(CONFIG_EXAMPLE_PATH) or {}
+        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
+            yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+        return config
 
-    def load_from_file(self) -> "Settings":
-        """从配置文件加载配置"""
+def _load_json_config() -> Any:
+    """读取 config.json"""
+    with open(CONFIG_JSON_PATH, 'rb') as f:
+        return json.load(f)
+
+# 按优先级排列的配置加载器
+_CONFIG_LOADERS = (
+    ("config.yaml", _load_yaml_config),
+    ("config.json", _load_json_config),
+)
+
+def _load_config_dict() -> Dict[str, Any]:
+    """依次尝试各配置加载器，返回第一个非空的原始配置字典"""
+    for name, loader in _CONFIG_LOADERS:
         try:
-            # 首先尝试加载 YAML 格式
-            try:
-                if os.path.exists('config.yaml'):
-                    with open('config.yaml', 'r', encoding='utf-8') as f:
-                        config = yaml.safe_load(f)
-                        if config:
-                            print("YAML配置文件加载成功")
-                            self._update_from_dict(config)
-                            return self
-                else:
-                    print("配置文件 config.yaml 不存在，使用默认配置")
-            except Exception as yaml_error:
-                print(f"加载YAML配置失败: {str(yaml_error)}, 尝试加载JSON配置")
-            
-            # 尝试加载标准 JSON
-            try:
-                if os.path.exists('config.json'):
-                    with open('config.json', 'r', encoding='utf-8') as f:
-                        config = json.load(f)
-                        print("JSON配置文件加载成功")
-                        self._update_from_dict(config)
-                        return self
-                else:
-                    print("配置文件 config.json 不存在")
-            except Exception as json_error:
-                print(f"加载JSON配置失败: {str(json_error)}")
-                
+            config = loader()
+        except FileNotFoundError:
+            _log.info("配置文件 %s 不存在", name)
+            continue
         except Exception as e:
-            print(f"加载配置文件失败: {str(e)}")
-        
-        return self
-    
-    def _update_from_dict(self, config: Dict[str, Any]) -> None:
-        """从字典更新配置，设置所有属性"""
-        # API配置
-        self.API_KEY = config.get("api", {}).get("key", "")
-        self.API_BASE_URL = config.get("api", {}).get("base_url", "https://api.openai.com/v1")
-        self.API_TIMEOUT = config.get("api", {}).get("timeout", 30)
-        self.API_AUTH_ENABLED = config.get("api", {}).get("auth_enabled", True)
-        self.API_RATE_LIMIT = config.get("api", {}).get("rate_limit", 60)
-        
-        # 模型配置
-        self.MODEL_NAME = config.get("model", {}).get("name", "gpt-3.5-turbo")
-        self.MODEL_TEMPERATURE = config.get("model", {}).get("temperature", 0.7)
-        self.MODEL_MAX_TOKENS = config.get("model", {}).get("max_tokens", 4096)
-        self.MODEL_TOP_P = config.get("model", {}).get("top_p", 0.9)
-        self.MODEL_FREQUENCY_PENALTY = config.get("model", {}).get("frequency_penalty", 0)
-        self.MODEL_PRESENCE_PENALTY = config.get("model", {}).get("presence_penalty", 0)
-        self.MODEL_INPUT_PRICE_PER_1K = config.get("model", {}).get("input_price_per_1k", 0.001)
-        self.MODEL_OUTPUT_PRICE_PER_1K = config.get("model", {}).get("output_price_per_1k", 0.002)
-        
-        # 嵌入模型配置 - 修复这里的问题，确保所有属性都有正确设置
-        embedding = config.get("embedding", {})
-        self.EMBEDDING_MODEL = embedding.get("model", "text-embedding-ada-002")
-        self.EMBEDDING_BASE_URL = embedding.get("base_url", "")
-        self.EMBEDDING_API_KEY = embedding.get("api_key", "")
-        self.EMBEDDING_TIMEOUT = embedding.get("timeout", 30)
-        self.EMBEDDING_DIMENSION = embedding.get("dimension", 1024)
-        
-        # 重排序配置
-        self.RERANK_ENABLED = config.get("rerank", {}).get("enabled", True)
-        self.RERANK_MODEL = config.get("rerank", {}).get("model", "BAAI/bge-reranker-v2-m3")
-        self.RERANK_TOP_N = config.get("rerank", {}).get("top_n", 5)
-        
-        # 网络搜索配置
-        web_search = config.get("web_search", {})
-        self.WEB_SEARCH_ENABLED = web_search.get("enabled", False)
-        self.WEB_SEARCH_NUM_RESULTS = web_search.get("num_results", 5)
-        self.GOOGLE_API_KEY = web_search.get("google", {}).get("api_key", "")
-        self.GOOGLE_CSE_ID = web_search.get("google", {}).get("cse_id", "")
-        self.SERPAPI_API_KEY = web_search.get("serpapi", {}).get("api_key", "")
-        
-        # 检索配置
-        self.RETRIEVAL_GRAPH_RELATED_DEPTH = config.get("retrieval", {}).get("graph_related_depth", 2)
-        self.RETRIEVAL_MIN_SIMILARITY = config.get("retrieval", {}).get("min_similarity", 0.7)
-        self.RETRIEVAL_FILTER_SIMILARITY_THRESHOLD = config.get("retrieval", {}).get("filter_similarity_threshold", 0.8)
-        self.RETRIEVAL_PAGE_SIZE = config.get("retrieval", {}).get("page_size", 10)
-        self.RETRIEVAL_MAX_PAGE_SIZE = config.get("retrieval", {}).get("max_page_size", 100)
-        
-        # 存储配置
-        storage = config.get("storage", {})
-        # Neo4j
-        self.NEO4J_URI = storage.get("neo4j", {}).get("uri", "bolt://localhost:7687")
-        self.NEO4J_USER = storage.get("neo4j", {}).get("user", "neo4j")
-        self.NEO4J_PASSWORD = storage.get("neo4j", {}).get("password", "neo4j")
-        self.NEO4J_POOL_SIZE = storage.get("neo4j", {}).get("pool_size", 50)
-        # FAISS
-        self.FAISS_DIMENSION = storage.get("faiss", {}).get("dimension", 1024)
-        self.FAISS_INDEX_TYPE = storage.get("faiss", {}).get("index_type", "flat")
-        self.FAISS_REBUILD_INDEX = storage.get("faiss", {}).get("rebuild_index", False)
-        self.FAISS_MAX_INDEX_SIZE = storage.get("faiss", {}).get("max_index_size", 1000000)
-        self.FAISS_INDEX_PATH = storage.get("faiss", {}).get("index_path", "data/faiss_index.pkl")
-        # MySQL
-        self.MYSQL_HOST = storage.get("mysql", {}).get("host", "localhost")
-        self.MYSQL_PORT = storage.get("mysql", {}).get("port", 3306)
-        self.MYSQL_USER = storage.get("mysql", {}).get("user", "root")
-        self.MYSQL_PASSWORD = storage.get("mysql", {}).get("password", "password")
-        self.MYSQL_DATABASE = storage.get("mysql", {}).get("database", "neko_ai")
-        self.MYSQL_POOL_SIZE = storage.get("mysql", {}).get("pool_size", 5)
-
-        # 多对话配置
-        conv = config.get("conversation", {})
-        self.DEFAULT_CONVERSATION_ID = conv.get("default_id", "default")
-        self.MAX_CONVERSATIONS = conv.get("max_conversations", 100)
-        self.CONVERSATION_TITLE_MAX_LENGTH = conv.get("title_max_length", 100)
-        self.CONVERSATION_CONTEXT_WINDOW_SIZE = conv.get("context_window_size", 15)
-        self.USE_MYSQL_CONTEXT = conv.get("use_mysql_context", True)
-        
-        # 应用配置
-        app = config.get("app", {})
-        self.APP_NAME = app.get("name", "Neko API")
-        self.APP_VERSION = app.get("version", "1.1.0")
-        self.APP_DESCRIPTION = app.get("description", "Neko AI助手API")
-        self.DEBUG = app.get("debug", False)
-        self.APP_HOST = app.get("host", "localhost")
-        self.APP_PORT = app.get("port", 9999)
-        
-        # 文件路径
-        paths = config.get("paths", {})
-        self.BASE_MD_PATH = paths.get("base_md", "base.md")
-        self.PROMPT_MD_PATH = paths.get("prompt_md", "prompt.md")
-        self.LOGS_DIR = paths.get("logs_dir", "logs")
-        self.BACKUPS_DIR = paths.get("backups_dir", "backups")
-        
-        # 知识库配置
-        knowledge = config.get("knowledge", {})
-        self.KNOWLEDGE_DIR = knowledge.get("dir", "knowledge/data")
-        self.KNOWLEDGE_INDEX_PATH = knowledge.get("index_path", "knowledge/index/knowledge_index.pkl")
-        self.KNOWLEDGE_CHUNK_SIZE = knowledge.get("chunk_size", 1000)
-        self.KNOWLEDGE_CHUNK_OVERLAP = knowledge.get("chunk_overlap", 200)
-        self.KNOWLEDGE_MAX_FILE_SIZE = knowledge.get("max_file_size", 10 * 1024 * 1024)
-        
-        # 日志配置
-        logging = config.get("logging", {})
-        self.LOG_LEVEL = logging.get("level", "INFO")
-        self.LOG_CONSOLE = logging.get("console", True)
-        self.LOG_FILE = logging.get("file", True)
-        self.LOG_MAX_SIZE = logging.get("max_size", 10)
-        self.LOG_BACKUP_COUNT = logging.get("backup_count", 5)
-        self.LOG_REQUESTS = logging.get("log_requests", True)
-        
-        # 用户信息
-        user = config.get("user", {})
-        self.USER_USERNAME = user.get("username", "admin")
-        self.USER_PASSWORD_HASH = user.get("password_hash", "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918")
-        self.USER_EMAIL = user.get("email", "admin@example.com")
-        self.USER_ROLE = user.get("role", "admin")
-        self.USER_ENABLED = user.get("enabled", True)
-        self.USER_CREATED_AT = user.get("created_at", "2023-01-01 00:00:00")
-        
-        # TTS配置
-        tts = config.get("tts", {})
-        self.TTS_ENABLED = tts.get("enabled", False)
-        self.TTS_FISH_API_KEY = tts.get("fish_api_key", "")
-        self.TTS_FISH_REFERENCE_ID = tts.get("fish_reference_id", "")
-        self.TTS_MODEL = tts.get("model", "speech-1.6")
-        self.TTS_DEVELOPER_ID = tts.get("developer_id", "")
-        self.TTS_SPEED = tts.get("speed", 1.0)
-        self.TTS_VOLUME = tts.get("volume", 1.0)
-        self.TTS_PITCH = tts.get("pitch", 0.0)
-
-# 创建全局设置实例
-settings = Settings()
+            _log.warning("加载配置文件 %s 失败: %s", name, e)
+            continue
+        if config:
+            _log.info("配置文件 %s 加载成功", name)
+            return config
+    _log.info("未找到可用的配置文件，使用默认配置")
+    return {}
+
+# 创建全局设置实例（只读快照）
+settings = Settings.get_instance().freeze()
+
+# 创建全局配置实例，与 settings 共享同一份原始配置
+config = Config()
+config._load_config()
+
+def get_config() -> Config:
+    """获取全局配置实例"""
+    return config
 
 # 确保必要的目录存在
-os.makedirs(settings.LOGS_DIR, exist_ok=True)
-os.makedirs(settings.BACKUPS_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(settings.FAISS_INDEX_PATH), exist_ok=True) 
\ No newline at end of file
+ensure_dirs(
+    settings.LOGS_DIR,
+    settings.BACKUPS_DIR,
+    os.path.dirname(settings.FAISS_INDEX_PATH),
+)
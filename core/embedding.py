@@ -1,15 +1,139 @@
+import base64
+import hashlib
+import heapq
+import random
+import threading
 import numpy as np
 import requests
 import time
-from typing import List, Dict, Any, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
+from requests.adapters import HTTPAdapter
 from core.config import settings
 from utils.logger import logger
+from utils import fastjson
 
 # LangChain相关导入
 from langchain_core.documents import Document
 
+def _create_session() -> requests.Session:
+    """创建带连接池的共享会话，复用 TCP/TLS 连接"""
+    session = requests.Session()
+    # 适配器不做重试，连接错误、超时和限流都由 _post_with_retry 统一退避处理，避免两层重试叠加
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# 嵌入和重排序请求共用的HTTP会话
+_SESSION = _create_session()
+
+class _EmbeddingCache:
+    """按文本哈希缓存嵌入向量的线程安全LRU缓存
+    
+    向量以只读 float16 存储，内存占用减半；读取时转换为新的 float32 数组返回，调用方拿到的类型与API结果一致。
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(text: str) -> bytes:
+        # 模型名参与哈希，避免不同模型的向量相互混用
+        return hashlib.blake2b(f"{settings.EMBEDDING_MODEL}\0{text}".encode("utf-8"), digest_size=16).digest()
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
+        if self.maxsize <= 0:
+            return None
+        key = self._key(text)
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is None:
+                return None
+            self._data.move_to_end(key)
+        return vector.astype(np.float32)
+    
+    def put(self, text: str, embedding: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        key = self._key(text)
+        vector = np.asarray(embedding).astype(np.float16)
+        vector.flags.writeable = False
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+# 进程内嵌入向量缓存
+_embedding_cache = _EmbeddingCache(settings.EMBEDDING_CACHE_SIZE)
+
+# 需要退避重试的HTTP状态码
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 需要退避重试的请求异常：连接失败和超时
+_RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# 最大重试次数
+_MAX_RETRIES = 4
+# 退避基数、上限和随机抖动（秒）
+_RETRY_BASE = 0.5
+_RETRY_CAP = 8.0
+_RETRY_JITTER = 0.5
+# 单次调用所有重试的累计等待上限（秒），包括 Retry-After 要求的等待
+_RETRY_BUDGET = 30.0
+
+def _retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    """计算重试等待时间：优先遵循 Retry-After，否则使用带抖动的指数退避"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return min(_RETRY_CAP, _RETRY_BASE * 2 ** attempt) + random.uniform(0, _RETRY_JITTER)
+
+def _post_with_retry(url: str, **kwargs) -> requests.Response:
+    """通过共享会话发送POST请求，连接失败、超时和429/5xx时指数退避重试，返回最后一次响应
+    
+    这是唯一的重试层。json 参数在这里序列化一次，重试时复用同一份请求体；
+    下一次等待会使累计等待超过 _RETRY_BUDGET 秒时不再重试，返回最后一次响应或抛出最后一次异常。
+    """
+    if "json" in kwargs:
+        kwargs["data"] = fastjson.dumps(kwargs.pop("json"))
+    waited = 0.0
+    for attempt in range(_MAX_RETRIES + 1):
+        error = None
+        try:
+            response = _SESSION.post(url, **kwargs)
+        except _RETRY_EXCEPTIONS as e:
+            error, response = e, None
+        if error is None and response.status_code not in _RETRY_STATUSES:
+            return response
+        
+        delay = _retry_delay(response, attempt)
+        if attempt == _MAX_RETRIES or waited + delay > _RETRY_BUDGET:
+            if error is not None:
+                raise error
+            return response
+        reason = type(error).__name__ if error is not None else f"状态码 {response.status_code}"
+        logger.warning(f"请求 {url} 失败（{reason}），{delay:.2f}秒后进行第 {attempt + 1} 次重试")
+        time.sleep(delay)
+        waited += delay
+    return response
+
+def _decode_embedding(value: Union[str, List[float]]) -> np.ndarray:
+    """解析单个嵌入向量：base64 字符串按小端 float32 整体解码，浮点数列表走逐元素转换
+    
+    np.frombuffer 返回的数组引用只读的 bytes，复制一份，调用方（如归一化）可以原地修改。
+    """
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype="<f4").copy()
+    return np.array(value, dtype=np.float32)
+
 def get_embedding(text: str) -> np.ndarray:
-    """获取文本嵌入向量，直接使用API"""
+    """获取文本嵌入向量，优先读取缓存，返回 float32 向量"""
     if not text or not isinstance(text, str):
         raise ValueError("输入文本不能为空且必须是字符串类型")
     
@@ -21,8 +145,13 @@ def get_embedding(text: str) -> np.ndarray:
     if not text:
         raise ValueError("输入文本不能全为空白字符")
     
-    # 直接使用API获取嵌入向量
+    # 优先使用缓存，未命中时再请求API
+    embedding = _embedding_cache.get(text)
+    if embedding is not None:
+        logger.debug(f"嵌入向量缓存命中，文本长度: {len(text)} 字符")
+        return embedding
     embedding = get_embedding_from_api(text)
+    _embedding_cache.put(text, embedding)
     
     # 记录耗时
     elapsed_time = time.time() - start_time
@@ -49,13 +178,13 @@ def get_embedding_from_api(text: str) -> np.ndarray:
     data = {
         "model": settings.EMBEDDING_MODEL,
         "input": text,
-        "encoding_format": "float"
+        "encoding_format": settings.EMBEDDING_ENCODING_FORMAT
     }
     
     try:
         # 发送请求
         logger.info(f"开始请求embedding API，文本长度: {len(text)} 字符")
-        response = requests.post(
+        response = _post_with_retry(
             f"{base_url}",
             headers=headers,
             json=data,
@@ -82,7 +211,7 @@ def get_embedding_from_api(text: str) -> np.ndarray:
                 raise Exception(error_msg)
         
         # 解析响应
-        result = response.json()
+        result = fastjson.loads(response.content)
         
         # 检查响应格式
         if not isinstance(result, dict) or 'data' not in result:
@@ -99,7 +228,7 @@ def get_embedding_from_api(text: str) -> np.ndarray:
         logger.info(f"embedding API请求完成，耗时: {elapsed_time:.2f}秒")
         
         # 转换为numpy数组
-        return np.array(embedding, dtype=np.float32)
+        return _decode_embedding(embedding)
         
     except requests.exceptions.RequestException as e:
         elapsed_time = time.time() - start_time
@@ -116,6 +245,116 @@ def get_embedding_from_api(text: str) -> np.ndarray:
             logger.error(f"API响应: {response.text}")
         raise Exception(f"获取embedding失败: {str(e)}")
 
+def _embed_batch(texts: List[str]) -> List[np.ndarray]:
+    """一次请求获取一批文本的嵌入向量，返回顺序与输入一致"""
+    base_url = settings.EMBEDDING_BASE_URL if settings.EMBEDDING_BASE_URL else settings.API_BASE_URL
+    api_key = settings.EMBEDDING_API_KEY if settings.EMBEDDING_API_KEY else settings.API_KEY
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    data = {
+        "model": settings.EMBEDDING_MODEL,
+        "input": texts,
+        "encoding_format": settings.EMBEDDING_ENCODING_FORMAT
+    }
+    
+    logger.info(f"开始批量请求embedding API，文本数: {len(texts)}")
+    response = _post_with_retry(
+        f"{base_url}",
+        headers=headers,
+        json=data,
+        timeout=settings.EMBEDDING_TIMEOUT
+    )
+    
+    if response.status_code != 200:
+        # 批量请求超过限制时，将批次对半拆分后分别请求
+        if response.status_code == 413:
+            if len(texts) == 1:
+                # 单条文本仍然过长，交给单条接口逐步截断
+                return [get_embedding_from_api(texts[0])]
+            half = len(texts) // 2
+            logger.warning(f"批量请求超过限制，拆分为 {half} + {len(texts) - half} 条重新请求")
+            return _embed_batch(texts[:half]) + _embed_batch(texts[half:])
+        error_msg = f"API请求失败 (状态码: {response.status_code}): {response.text}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    result = fastjson.loads(response.content)
+    if not isinstance(result, dict) or not isinstance(result.get('data'), list) or len(result['data']) != len(texts):
+        raise Exception(f"API返回格式错误: {result}")
+    
+    # OpenAI 风格接口不保证返回顺序，按 index 字段还原
+    items = sorted(result['data'], key=lambda item: item.get('index', 0))
+    embeddings = [_decode_embedding(item['embedding']) for item in items]
+    for text, embedding in zip(texts, embeddings):
+        _embedding_cache.put(text, embedding)
+    return embeddings
+
+def _merge_batch_results(batches: List[List[str]], results: List[Any]) -> List[np.ndarray]:
+    """按批次顺序合并结果，失败的批次以零向量占位"""
+    embeddings = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, BaseException):
+            logger.error(f"批量获取嵌入向量失败: {str(result)}")
+            embeddings.extend(np.zeros(settings.EMBEDDING_DIMENSION, dtype=np.float32) for _ in batch)
+        else:
+            embeddings.extend(result)
+    return embeddings
+
+def get_embeddings_from_api(texts: List[str], chunk_size: int = None) -> List[np.ndarray]:
+    """使用 API 批量获取嵌入向量，各批次由线程池并发请求
+    
+    Args:
+        texts: 已清理的非空文本列表
+        chunk_size: 每个请求的文本数量，默认使用配置中的 EMBEDDING_BATCH_SIZE
+        
+    Returns:
+        List[np.ndarray]: 与输入顺序一致的嵌入向量列表，失败的批次以零向量占位
+    """
+    chunk_size = chunk_size or settings.EMBEDDING_BATCH_SIZE
+    batches = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    if len(batches) <= 1:
+        results = []
+        for batch in batches:
+            try:
+                results.append(_embed_batch(batch))
+            except Exception as e:
+                results.append(e)
+        return _merge_batch_results(batches, results)
+    
+    max_workers = max(1, min(settings.EMBEDDING_CONCURRENCY, len(batches)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_embed_batch, batch) for batch in batches]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    return _merge_batch_results(batches, results)
+
+def _prepare_texts(texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int], List[str]]:
+    """清理输入文本：无效文本用零向量占位，缓存命中的直接填入，返回占位列表、待请求文本的位置和内容"""
+    embeddings = [None] * len(texts)
+    valid_positions = []
+    valid_texts = []
+    for i, text in enumerate(texts):
+        cleaned = text.strip() if isinstance(text, str) else ""
+        if cleaned:
+            cached = _embedding_cache.get(cleaned)
+            if cached is not None:
+                embeddings[i] = cached
+                continue
+            valid_positions.append(i)
+            valid_texts.append(cleaned)
+        else:
+            logger.error(f"获取嵌入向量失败: 第 {i} 条输入文本为空或不是字符串")
+            embeddings[i] = np.zeros(settings.EMBEDDING_DIMENSION, dtype=np.float32)
+    return embeddings, valid_positions, valid_texts
+
 def get_embeddings(texts: List[str]) -> List[np.ndarray]:
     """批量获取文本嵌入向量
     
@@ -127,23 +366,43 @@ def get_embeddings(texts: List[str]) -> List[np.ndarray]:
     """
     if not texts:
         return []
-        
-    embeddings = []
     
-    # 单独处理每个文本，使用API获取嵌入向量
-    for text in texts:
-        try:
-            embedding = get_embedding(text)
-            embeddings.append(embedding)
-        except Exception as e:
-            logger.error(f"获取嵌入向量失败: {str(e)}")
-            # 插入一个零向量作为占位符
-            embeddings.append(np.zeros(settings.EMBEDDING_DIMENSION, dtype=np.float32))
+    start_time = time.time()
+    
+    embeddings, valid_positions, valid_texts = _prepare_texts(texts)
+    for i, embedding in zip(valid_positions, get_embeddings_from_api(valid_texts)):
+        embeddings[i] = embedding
+    
+    elapsed_time = time.time() - start_time
+    logger.info(f"批量获取嵌入向量完成，文本数: {len(texts)}，耗时: {elapsed_time:.2f}秒")
     
     return embeddings
 
+def _rerank_chunk(url: str, headers: Dict[str, str], query: str, documents: List[str],
+                  top_n: int, offset: int) -> List[Dict[str, Any]]:
+    """对一个文档分块请求重排序API，返回结果的 index 换算为在完整文档列表中的位置"""
+    data = {
+        "model": settings.RERANK_MODEL,
+        "query": query,
+        "documents": documents,
+        "top_n": min(top_n, len(documents)),
+        "return_documents": False,  # 不需要返回文档内容
+        "max_chunks_per_doc": 1024,
+        "overlap_tokens": 80
+    }
+    response = _post_with_retry(url, headers=headers, json=data, timeout=settings.EMBEDDING_TIMEOUT)
+    
+    # 检查响应状态
+    if response.status_code != 200:
+        raise Exception(f"重排序API请求失败 (状态码: {response.status_code}): {response.text}")
+    
+    results = fastjson.loads(response.content).get("results", [])
+    for item in results:
+        item["index"] = item.get("index", 0) + offset
+    return results
+
 def rerank_documents(query: str, documents: List[str], top_n: int = None) -> List[Dict[str, Any]]:
-    """使用重排序API对文档进行重排序
+    """使用重排序API对文档进行重排序，文档较多时按 RERANK_CHUNK_SIZE 分块、最多 RERANK_CONCURRENCY 个并发请求后合并
     
     Args:
         query: 查询文本
@@ -165,6 +424,7 @@ def rerank_documents(query: str, documents: List[str], top_n: int = None) -> Lis
     api_key = settings.EMBEDDING_API_KEY if settings.EMBEDDING_API_KEY else settings.API_KEY
     
     # 准备API请求
+    url = f"{base_url}/rerank"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -174,38 +434,23 @@ def rerank_documents(query: str, documents: List[str], top_n: int = None) -> Lis
     if top_n is None:
         top_n = len(documents)
     
-    # API请求数据
-    data = {
-        "model": settings.RERANK_MODEL,
-        "query": query,
-        "documents": documents,
-        "top_n": top_n,
-        "return_documents": False,  # 不需要返回文档内容
-        "max_chunks_per_doc": 1024,
-        "overlap_tokens": 80
-    }
+    chunk_size = max(1, settings.RERANK_CHUNK_SIZE)
+    offsets = range(0, len(documents), chunk_size)
     
     try:
-        # 发送请求
-        response = requests.post(
-            f"{base_url}/rerank",
-            headers=headers,
-            json=data,
-            timeout=settings.EMBEDDING_TIMEOUT
-        )
-        
-        # 检查响应状态
-        if response.status_code != 200:
-            error_msg = f"重排序API请求失败 (状态码: {response.status_code}): {response.text}"
-            logger.error(error_msg)
-            return []
-        
-        # 解析响应
-        result = response.json()
+        if len(offsets) == 1:
+            return _rerank_chunk(url, headers, query, documents, top_n, 0)
         
-        # 返回重排序结果
-        return result.get("results", [])
+        # 各分块只需返回自身的前 top_n 条，合并后再取全局前 top_n 条
+        max_workers = max(1, min(settings.RERANK_CONCURRENCY, len(offsets)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_rerank_chunk, url, headers, query, documents[start:start + chunk_size], top_n, start)
+                for start in offsets
+            ]
+            merged = [item for future in futures for item in future.result()]
+        return heapq.nlargest(top_n, merged, key=lambda item: item.get("relevance_score", 0.0))
         
     except Exception as e:
         logger.error(f"重排序过程中发生错误: {str(e)}")
-        return [] 
\ No newline at end of file
+        return [] 
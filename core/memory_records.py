@@ -0,0 +1,145 @@
+import itertools
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable
+
+class MemoryRecords:
+    """按列存储的记忆记录
+
+    每个字段单独保存为一列：文本和时间戳使用列表，对话ID编码为 int32 数组（-1 表示全局记忆），
+    时间戳另外解析为 datetime64 数组（无法解析时为 NaT），避免每条记录一个字典的内存开销，
+    统计、按对话筛选和按时间排序可以直接在数组上完成。
+    无法拆分为用户消息和助手回复的旧记录，其原文本按下标单独保存在 raw_texts 中。
+    """
+
+    def __init__(self):
+        self.user_messages: List[Optional[str]] = []
+        self.ai_responses: List[Optional[str]] = []
+        self.timestamps: List[Optional[str]] = []
+        # 记录下标 -> 无法拆分的原文本，这些记录的 user_message/ai_response 为 None
+        self.raw_texts: Dict[int, str] = {}
+        # 对话ID编码：编码 -> 对话ID，对话ID -> 编码；数组列按容量倍增预分配
+        self._conv_keys: List[Any] = []
+        self._conv_codes_of: Dict[Any, int] = {}
+        self._codes = np.empty(64, dtype=np.int32)
+        self._times = np.empty(64, dtype="datetime64[us]")
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict[str, Any]]) -> "MemoryRecords":
+        """从持久化格式的字典列表构建"""
+        records = cls()
+        for item in items:
+            records.append(
+                item.get("timestamp"), item.get("conversation_id"),
+                user_message=item.get("user_message"), ai_response=item.get("ai_response"),
+                text=item.get("text")
+            )
+        return records
+
+    @property
+    def conv_codes(self) -> np.ndarray:
+        """每条记录的对话ID编码，-1 表示全局记忆"""
+        return self._codes[:len(self)]
+
+    @property
+    def times(self) -> np.ndarray:
+        """每条记录解析后的时间戳，无法解析时为 NaT"""
+        return self._times[:len(self)]
+
+    @staticmethod
+    def _parse_time(timestamp: Optional[str]) -> np.datetime64:
+        """解析 "YYYY-MM-DD HH:MM:SS.ffffff" 格式的时间戳，无法解析时返回 NaT"""
+        try:
+            return np.datetime64(timestamp, "us")
+        except (ValueError, TypeError):
+            return np.datetime64("NaT", "us")
+
+    def code_of(self, conversation_id: Any) -> Optional[int]:
+        """对话ID对应的编码，从未出现过的对话返回 None"""
+        if conversation_id is None:
+            return -1
+        return self._conv_codes_of.get(conversation_id)
+
+    def append(self, timestamp: Optional[str], conversation_id: Any,
+               user_message: Optional[str] = None, ai_response: Optional[str] = None,
+               text: Optional[str] = None):
+        """追加一条记录，user_message 为 None 时按无法拆分的原文本保存"""
+        idx = len(self)
+        if idx == len(self._codes):
+            capacity = max(64, idx * 2)
+            self._codes = np.resize(self._codes, capacity)
+            self._times = np.resize(self._times, capacity)
+        code = self.code_of(conversation_id)
+        if code is None:
+            code = len(self._conv_keys)
+            self._conv_keys.append(conversation_id)
+            self._conv_codes_of[conversation_id] = code
+        self._codes[idx] = code
+        self._times[idx] = self._parse_time(timestamp)
+
+        if user_message is None:
+            self.raw_texts[idx] = text or ""
+            ai_response = None
+        self.user_messages.append(user_message)
+        self.ai_responses.append(ai_response)
+        self.timestamps.append(timestamp)
+
+    def set_message(self, idx: int, user_message: str, ai_response: str):
+        """将无法拆分的记录替换为拆分后的用户消息和助手回复"""
+        self.user_messages[idx] = user_message
+        self.ai_responses[idx] = ai_response
+        self.raw_texts.pop(idx, None)
+
+    def is_parsed(self, idx: int) -> bool:
+        """记录是否已拆分为用户消息和助手回复"""
+        return self.user_messages[idx] is not None
+
+    def conversation_id(self, idx: int) -> Any:
+        """记录所属的对话ID，全局记忆为 None"""
+        code = self._codes[idx]
+        return self._conv_keys[code] if code >= 0 else None
+
+    def to_dict(self, idx: int) -> Dict[str, Any]:
+        """转换为持久化格式的字典"""
+        conversation_id = self.conversation_id(idx)
+        if idx in self.raw_texts:
+            return {"text": self.raw_texts[idx], "timestamp": self.timestamps[idx], "conversation_id": conversation_id}
+        return {
+            "user_message": self.user_messages[idx],
+            "ai_response": self.ai_responses[idx],
+            "timestamp": self.timestamps[idx],
+            "conversation_id": conversation_id
+        }
+
+    def parsed_indices(self) -> np.ndarray:
+        """已拆分记录的下标数组"""
+        mask = np.ones(len(self), dtype=bool)
+        if self.raw_texts:
+            mask[list(self.raw_texts)] = False
+        return np.flatnonzero(mask)
+
+    def take(self, mask: np.ndarray) -> "MemoryRecords":
+        """按布尔掩码筛选记录，返回新的 MemoryRecords，对话ID编码保持不变"""
+        records = MemoryRecords()
+        records.user_messages = list(itertools.compress(self.user_messages, mask))
+        records.ai_responses = list(itertools.compress(self.ai_responses, mask))
+        records.timestamps = list(itertools.compress(self.timestamps, mask))
+        records._conv_keys = list(self._conv_keys)
+        records._conv_codes_of = dict(self._conv_codes_of)
+        records._codes = self.conv_codes[mask]
+        records._times = self.times[mask]
+        if self.raw_texts:
+            # 筛选后的新下标为该位置之前保留的记录数
+            new_positions = np.cumsum(mask) - 1
+            records.raw_texts = {int(new_positions[i]): text for i, text in self.raw_texts.items() if mask[i]}
+        return records
+
+    def conversation_counts(self) -> Dict[Any, int]:
+        """每个对话的记录数量，全局记忆的键为 None"""
+        codes, counts = np.unique(self.conv_codes, return_counts=True)
+        return {
+            (self._conv_keys[code] if code >= 0 else None): int(count)
+            for code, count in zip(codes.tolist(), counts.tolist())
+        }
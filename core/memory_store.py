@@ -1,73 +1,601 @@
 import os
+import atexit
+import hashlib
+import threading
+import time
 import pickle
+import functools
 import numpy as np
 import faiss
+import psutil
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from core.config import settings
 from utils.logger import logger
+from utils.rwlock import RWLock
+from utils import fastjson
 from models.memory import Memory
+from core.memory_records import MemoryRecords
+
+# 分页排序缓存中表示不按对话过滤的键
+_ALL_CONVERSATIONS = object()
+
+# 批量写入索引时每次 add 的最大向量数
+_ADD_CHUNK_SIZE = 16384
+
+# 在对话子集上精确搜索时每次取回并计算的最大向量数
+_SUBSET_SEARCH_CHUNK_SIZE = 16384
+
+def _read_locked(method):
+    """方法在读锁内执行，多个读操作可以并发"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._rwlock.read_lock():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _write_locked(method):
+    """方法在写锁内执行，与其他读写操作互斥"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._rwlock.write_lock():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+@functools.lru_cache(maxsize=None)
+def _gpu_available() -> bool:
+    """当前FAISS是否支持GPU且有可用GPU，只在首次调用时检测"""
+    available = hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+    if not available:
+        logger.warning("已开启FAISS_USE_GPU，但当前FAISS不支持GPU或没有可用GPU，使用CPU搜索")
+    return available
+
+class _SearchCache:
+    """按查询向量哈希缓存搜索结果的线程安全LRU缓存
+    
+    索引或记录发生任何变化时整体失效并递增版本号；搜索前记下版本号，写入缓存时版本号已变化则放弃，
+    避免与写入交错的搜索把过期结果放回缓存。
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.generation = 0
+        self._data: "OrderedDict[Tuple, List[Memory]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(query: np.ndarray, k: int, conversation_id: Any) -> Tuple:
+        return hashlib.blake2b(query.tobytes(), digest_size=16).digest(), k, conversation_id
+    
+    def get(self, key: Tuple) -> Optional[List[Memory]]:
+        with self._lock:
+            results = self._data.get(key)
+            if results is None:
+                return None
+            self._data.move_to_end(key)
+        # 调用方可能原地排序结果列表，返回副本
+        return list(results)
+    
+    def put(self, key: Tuple, results: List[Memory], generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._data[key] = list(results)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
 
 class FAISSMemoryStore:
+    """FAISS记忆存储
+    
+    FAISS索引支持并发搜索，但不支持搜索与写入同时进行，因此公开方法按读写分别加锁：
+    搜索和查询并发执行，写入、清除和保存独占。内部方法假定调用方已持有相应的锁。
+    """
+
     def __init__(self, dimension=None, index_type=None, index_path=None):
         self.dimension = dimension or settings.FAISS_DIMENSION
         self.index_type = index_type or settings.FAISS_INDEX_TYPE
         self.index_path = index_path or settings.FAISS_INDEX_PATH
-        self.texts = []
+        # 索引使用 faiss 原生格式保存，记忆文本按行追加写入 JSONL 文件
+        base_path = os.path.splitext(self.index_path)[0]
+        self.faiss_path = base_path + ".faiss"
+        self.texts_path = base_path + ".jsonl"
+        # 索引目录只在启动时创建一次，保存时不再检查
+        index_dir = os.path.dirname(self.faiss_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        # 索引和记忆文本文件的总大小（MB），只在文件被保存、加载或删除时重新统计
+        self._size_mb = 0.0
+        # 记忆记录按列存储，第 i 条记录对应FAISS索引中的第 i 个向量
+        self.records = MemoryRecords()
+        self._rwlock = RWLock()
+        # 分页用的按时间戳排列的记录下标，按对话ID和排序方向分别缓存，对应对话写入后失效
+        self._page_orders = {}
+        # 时间戳 -> 记录下标，只收录可解析的记录，同一时间戳保留第一条
+        self._ts_to_idx = {}
+        # 尚未保存到磁盘的写入数量；写入只设置事件，由后台线程合并保存
+        self._unsaved = 0
+        self._dirty = threading.Event()
+        self._batch_full = threading.Event()
+        # JSONL 文件中已写入的记忆条数，之后新增的记忆只需追加
+        self._texts_synced = 0
+        # 索引是否以只读内存映射方式加载，写入前需要读入内存
+        self._mmapped = False
+        # Flat索引在GPU上的副本，只用于不限定对话的搜索；GPU资源不是线程安全的，并发搜索需要串行
+        self._gpu_resources = None
+        self._gpu_index = None
+        self._gpu_lock = threading.Lock()
+        # 相同查询向量的搜索结果缓存，写入、清除和重新加载时失效
+        self._search_cache = _SearchCache(settings.FAISS_QUERY_CACHE_SIZE)
         
         # 尝试加载现有索引
-        if os.path.exists(self.index_path):
-            try:
-                logger.info(f"加载FAISS索引文件: {self.index_path}")
-                with open(self.index_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.index = data['index']
-                    self.texts = data.get('texts', [])
-                logger.info(f"FAISS索引加载成功，包含 {len(self.texts)} 条记忆")
-            except Exception as e:
-                logger.error(f"加载FAISS索引失败: {str(e)}")
-                self._create_new_index()
+        if os.path.exists(self.faiss_path) or self._has_legacy_index():
+            self._load_index()
         else:
             logger.info(f"FAISS索引文件不存在，创建新索引")
             self._create_new_index()
             # 立即保存空索引，避免下次启动时再次提示
-            self.save_index()
+            self._save_index()
             logger.info(f"已创建并保存新的FAISS索引")
+        self._update_size()
+        
+        # 后台保存线程；进程退出前保存尚未落盘的写入
+        self._persist_thread = threading.Thread(target=self._persist_loop, name="faiss-persist", daemon=True)
+        self._persist_thread.start()
+        atexit.register(self.flush)
+
+    def _has_legacy_index(self) -> bool:
+        """是否存在旧版 pickle 格式的索引文件"""
+        return self.index_path != self.faiss_path and os.path.exists(self.index_path)
+
+    def _load_index(self):
+        """从磁盘加载索引和记忆文本，旧版 pickle 文件会被转换为新格式"""
+        self._search_cache.clear()
+        try:
+            if os.path.exists(self.faiss_path):
+                logger.info(f"加载FAISS索引文件: {self.faiss_path}")
+                self.index = self._read_index()
+                self.records = MemoryRecords.from_dicts(self._read_texts())
+                self._migrate_records()
+                self._align_records()
+                self._configure_index()
+            else:
+                logger.info(f"加载旧版FAISS索引文件: {self.index_path}")
+                with open(self.index_path, 'rb') as f:
+                    data = pickle.load(f)
+                    self.index = data['index']
+                    self.records = MemoryRecords.from_dicts(data.get('texts', []))
+                self._migrate_records()
+                self._configure_index()
+                self._texts_synced = 0
+                if self._save_index():
+                    logger.info(f"旧版索引已转换为 {self.faiss_path} 和 {self.texts_path}")
+            
+            self._reset_caches()
+            logger.info(f"FAISS索引加载成功，包含 {len(self.records)} 条记忆")
+        except Exception as e:
+            logger.error(f"加载FAISS索引失败: {str(e)}")
+            self._quarantine_files()
+            self._create_new_index()
+
+    def _quarantine_files(self):
+        """加载失败时把现有的索引和记忆文本文件改名保留，避免随后保存的空索引覆盖它们，便于人工恢复"""
+        suffix = f".corrupt-{int(time.time())}"
+        for path in (self.faiss_path, self.texts_path):
+            if os.path.exists(path):
+                os.replace(path, path + suffix)
+                logger.error(f"已将无法加载的文件保留为 {path + suffix}")
+        self._texts_synced = 0
+
+    def _align_records(self):
+        """将索引和记忆记录截断到两者共有的前缀
+        
+        FAISS 向量ID就是记录下标。保存时先写索引再追加记忆文本，两步之间中断会使索引多出向量，
+        此后新增的记录与向量错位，因此加载时截断多出的部分并立即保存。
+        """
+        count = min(self.index.ntotal, len(self.records))
+        if self.index.ntotal == count and len(self.records) == count:
+            return
+        logger.warning(f"FAISS索引向量数 {self.index.ntotal} 与记忆条数 {len(self.records)} 不一致，截断为前 {count} 条")
+        if self.index.ntotal > count:
+            self._truncate_index(count)
+        if len(self.records) > count:
+            self.records = self.records.take(np.arange(len(self.records)) < count)
+            self._texts_synced = 0
+        self._save_index()
+
+    def _truncate_index(self, count: int):
+        """删除索引中下标不小于 count 的向量，HNSW 等不支持删除的索引用保留的向量重建"""
+        self._ensure_writable()
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            # 按ID删除不支持数组形式的 direct map，删除后由 _configure_index 重新建立
+            ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        try:
+            self.index.remove_ids(faiss.IDSelectorRange(count, self.index.ntotal))
+        except RuntimeError:
+            vectors = self.index.reconstruct_n(0, count)
+            records = self.records
+            self._create_new_index()
+            self.records = records
+            # 向量在首次写入时已归一化，直接加入新索引
+            self.index.add(vectors)
+
+    def _read_index(self):
+        """读取 faiss 索引文件
+        
+        IVF类索引在开启 FAISS_MMAP 时以只读内存映射方式加载，向量由系统页缓存承载，
+        启动快且不占用额外内存，但单次查询略慢；Flat/HNSW 索引始终读入内存。
+        """
+        self._mmapped = False
+        if settings.FAISS_MMAP and self.index_type.lower() in ("ivf", "ivfpq"):
+            index = faiss.read_index(self.faiss_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            if faiss.try_extract_index_ivf(index) is not None:
+                self._mmapped = True
+                return index
+        return faiss.read_index(self.faiss_path)
+
+    def _ensure_writable(self):
+        """内存映射的索引是只读的，首次写入前将索引文件完整读入内存"""
+        if not self._mmapped:
+            return
+        logger.info(f"首次写入，将内存映射的FAISS索引读入内存: {self.faiss_path}")
+        self.index = faiss.read_index(self.faiss_path)
+        self._mmapped = False
+        self._configure_index()
+
+    def _read_texts(self) -> List[Dict[str, Any]]:
+        """读取 JSONL 记忆文本
+        
+        只有最后一行允许无法解析（追加写入中断），丢弃该行并在下次保存时整体重写文件；
+        其他位置的行无法解析说明文件已损坏，跳过会让之后的记录与向量错位，因此抛出 ValueError。
+        """
+        texts = []
+        self._texts_synced = 0
+        if not os.path.exists(self.texts_path):
+            return texts
+        torn_line = None
+        complete = True
+        with open(self.texts_path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                if torn_line is not None:
+                    raise ValueError(f"记忆文本文件已损坏: {self.texts_path} 第 {torn_line} 行无法解析")
+                try:
+                    texts.append(fastjson.loads(line))
+                except ValueError:
+                    torn_line = line_no
+                # 最后一行缺少换行符时不能直接追加，下次保存时整体重写
+                complete = line.endswith(b"\n")
+        if torn_line is not None:
+            logger.warning(f"丢弃写入中断的最后一条记忆记录: {self.texts_path} 第 {torn_line} 行")
+        elif complete:
+            self._texts_synced = len(texts)
+        return texts
+
+    def _write_texts(self):
+        """保存记忆文本：只有新增时追加到文件末尾，否则整体重写"""
+        start = self._texts_synced
+        count = len(self.records)
+        if 0 < start <= count and os.path.exists(self.texts_path):
+            with open(self.texts_path, 'ab') as f:
+                f.writelines(fastjson.dumps(self.records.to_dict(i)) + b"\n" for i in range(start, count))
+        else:
+            tmp_path = self.texts_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.writelines(fastjson.dumps(self.records.to_dict(i)) + b"\n" for i in range(count))
+            os.replace(tmp_path, self.texts_path)
+        self._texts_synced = count
+
+    @staticmethod
+    def _split_text(text: str) -> Optional[Tuple[str, str]]:
+        """将 "用户: xxx\n助手: xxx" 格式的文本拆分为用户消息和助手回复，无法拆分时返回 None"""
+        parts = text.split("\n助手: ")
+        if len(parts) == 2:
+            return parts[0].replace("用户: ", ""), parts[1]
+        return None
+
+    def _migrate_records(self):
+        """将旧版只保存 text 字段的记录拆分为 user_message/ai_response，下次保存时重写文件"""
+        migrated = 0
+        for i, text in list(self.records.raw_texts.items()):
+            parts = self._split_text(text)
+            if parts is not None:
+                self.records.set_message(i, *parts)
+                migrated += 1
+        if migrated:
+            self._texts_synced = 0
+            self._mark_dirty(migrated)
+            logger.info(f"已转换 {migrated} 条旧格式记忆记录")
+
+    def _append_record(self, text: str, timestamp: str, conversation_id: Optional[int]):
+        """拆分对话文本后追加一条记忆记录，并更新时间戳下标（写入时拆分，读取时无需再解析）"""
+        idx = len(self.records)
+        parts = self._split_text(text)
+        if parts is not None:
+            self.records.append(timestamp, conversation_id, *parts)
+            self._ts_to_idx.setdefault(timestamp, idx)
+        else:
+            self.records.append(timestamp, conversation_id, text=text)
+        self._page_orders.pop(conversation_id, None)
+        self._page_orders.pop(_ALL_CONVERSATIONS, None)
+
+    def _reset_caches(self):
+        """记录被整体替换后重建时间戳下标，并使分页排序缓存失效"""
+        self._ts_to_idx = {}
+        timestamps = self.records.timestamps
+        for i in self.records.parsed_indices().tolist():
+            self._ts_to_idx.setdefault(timestamps[i], i)
+        self._page_orders = {}
+
+    def _conversation_indices(self, conversation_id: Any) -> np.ndarray:
+        """指定对话的记录下标数组，在对话ID编码列上比较得到"""
+        code = self.records.code_of(conversation_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.records.conv_codes == code)
+
+    def _is_exhaustive(self) -> bool:
+        """当前索引搜索时是否扫描全部向量（Flat/SQ8），只有这类索引在搜索内部按ID过滤的结果是精确的"""
+        return isinstance(self.index, (faiss.IndexFlat, faiss.IndexScalarQuantizer))
+
+    def _search_filtered(self, queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """只在指定向量ID中搜索
+        
+        Flat/SQ8 索引用 IDSelectorBatch 在搜索内部过滤。HNSW/IVF 的近似搜索只访问 efSearch/nprobe 范围内的候选，
+        在其中过滤会丢掉候选之外的成员，对话记忆占比小时几乎找不到结果；因此对这些索引分块取回指定向量，
+        在子集上精确搜索并合并各块的前k个结果。
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._is_exhaustive():
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+            return self.index.search(queries, k, params=params)
+        
+        metric = self.index.metric_type
+        heap = faiss.ResultHeap(len(queries), k, keep_max=metric == faiss.METRIC_INNER_PRODUCT)
+        for start in range(0, len(ids), _SUBSET_SEARCH_CHUNK_SIZE):
+            chunk_ids = ids[start:start + _SUBSET_SEARCH_CHUNK_SIZE]
+            vectors = self.index.reconstruct_batch(chunk_ids)
+            distances, positions = faiss.knn(queries, vectors, min(k, len(chunk_ids)), metric=metric)
+            heap.add_result(distances, chunk_ids[positions])
+        heap.finalize()
+        return heap.D, heap.I
+
+    def _get_page_order(self, conversation_id: Optional[Any], descending: bool = False) -> np.ndarray:
+        """返回可解析记录按时间戳排列的下标数组，指定对话ID时只包含该对话的记录
+        
+        升序和降序都是稳定排序（时间戳相同的记录保持写入顺序），无法解析的时间戳（NaT）始终排在最后。
+        """
+        key = _ALL_CONVERSATIONS if conversation_id is None else conversation_id
+        orders = self._page_orders.setdefault(key, {})
+        order = orders.get(descending)
+        if order is None:
+            valid = self.records.parsed_indices()
+            if conversation_id is not None:
+                valid = np.intersect1d(valid, self._conversation_indices(conversation_id), assume_unique=True)
+            times = self.records.times[valid]
+            nat = np.isnat(times)
+            # 在 datetime64 的整数表示上取反实现稳定降序；NaT 单独拼接在末尾，不参与取反
+            keys = times[~nat].view(np.int64)
+            if descending:
+                keys = -keys
+            order = np.concatenate((valid[~nat][np.argsort(keys, kind="stable")], valid[nat]))
+            orders[descending] = order
+        return order
+
+    @_write_locked
+    def reload_index(self):
+        """重新从磁盘加载索引，用于从备份恢复后"""
+        self._unsaved = 0
+        self._texts_synced = 0
+        if os.path.exists(self.faiss_path) or self._has_legacy_index():
+            self._load_index()
+        else:
+            self._create_new_index()
+        self._update_size()
     
     def _create_new_index(self):
         """创建新的FAISS索引"""
-        if self.index_type.lower() == "flat":
-            self.index = faiss.IndexFlatL2(self.dimension)
-        elif self.index_type.lower() == "ivf":
-            # IVF索引需要训练，这里使用简单的随机数据
-            quantizer = faiss.IndexFlatL2(self.dimension)
-            self.index = faiss.IndexIVFFlat(quantizer, self.dimension, 100)
-            # 生成随机训练数据
-            np.random.seed(42)
-            train_data = np.random.random((1000, self.dimension)).astype('float32')
-            self.index.train(train_data)
+        index_type = self.index_type.lower()
+        metric = self._metric()
+        if index_type == "flat":
+            self.index = faiss.IndexFlat(self.dimension, metric)
+        elif index_type in ("ivf", "ivfpq", "sq8"):
+            # IVF/IVFPQ/SQ8需要在真实向量上训练，积累到足够数据前先用Flat索引预热，见 _maybe_train_index
+            self.index = faiss.IndexFlat(self.dimension, metric)
+        elif index_type == "hnsw":
+            self.index = faiss.IndexHNSWFlat(self.dimension, settings.FAISS_HNSW_M, metric)
+            self.index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
         else:
             # 默认使用Flat索引
-            self.index = faiss.IndexFlatL2(self.dimension)
+            self.index = faiss.IndexFlat(self.dimension, metric)
+        
+        self._configure_index()
+        self._mmapped = False
+        self.records = MemoryRecords()
+        self._reset_caches()
+        self._search_cache.clear()
+
+    @staticmethod
+    def _metric() -> int:
+        """新建索引使用的距离度量：ip 为内积（向量归一化后即余弦相似度），l2 为欧氏距离"""
+        if settings.FAISS_METRIC.lower() == "l2":
+            return faiss.METRIC_L2
+        return faiss.METRIC_INNER_PRODUCT
+
+    def _uses_inner_product(self) -> bool:
+        """当前索引是否使用内积度量，已有的L2索引在重建前保持原度量"""
+        return self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """内积索引的向量需要L2归一化，使内积等于余弦相似度；零向量保持不变"""
+        if not self._uses_inner_product():
+            return vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+    def _configure_index(self):
+        """设置查询参数（nprobe/efSearch），并为IVF索引建立直接映射以支持 reconstruct"""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = settings.FAISS_NPROBE
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+        elif isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+        self._sync_gpu_index()
+
+    def _sync_gpu_index(self):
+        """开启 FAISS_USE_GPU 且有可用GPU时，将Flat索引复制到GPU
+        
+        CPU上的索引始终是完整数据，负责保存、删除和按对话过滤的搜索，GPU副本只加速全量扫描。
+        """
+        self._gpu_index = None
+        if not settings.FAISS_USE_GPU or not isinstance(self.index, faiss.IndexFlat):
+            return
+        if not _gpu_available():
+            return
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()
+            # 不预分配临时显存，避免每个进程固定占用数百MB显存
+            self._gpu_resources.noTempMemory()
+        self._gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.index)
+        logger.info(f"FAISS索引已复制到GPU，包含 {self.index.ntotal} 条向量")
+
+    def _prepare_vectors(self, vectors) -> np.ndarray:
+        """转换为FAISS需要的二维、C连续的 float32 数组，已满足要求时直接返回原数组不复制
+        
+        FAISS只在 add/search 调用期间读取传入的缓冲区，不保留引用，调用返回后数组可以被修改或释放。
+        维度与索引不一致时截断或补零。
+        """
+        vectors = np.atleast_2d(np.asarray(vectors))
+        if vectors.shape[1] != self.dimension:
+            logger.warning(f"向量维度不匹配，预期: {self.dimension}, 实际: {vectors.shape[1]}，将{'截断' if vectors.shape[1] > self.dimension else '补零'}")
+            if vectors.shape[1] > self.dimension:
+                vectors = vectors[:, :self.dimension]
+            else:
+                vectors = self._pad_dimension(vectors)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _pad_dimension(self, vectors: np.ndarray) -> np.ndarray:
+        """维度不足的向量在末尾补零，直接写入一个目标维度的数组，不再单独分配补零块"""
+        padded = np.zeros((vectors.shape[0], self.dimension), dtype=np.float32)
+        padded[:, :vectors.shape[1]] = vectors
+        return padded
+
+    def _add_vectors(self, vectors: np.ndarray):
+        """归一化后向索引添加向量，同步添加到GPU副本，并在积累足够向量后训练索引
+        
+        大批量向量按 _ADD_CHUNK_SIZE 分块归一化和写入，归一化产生的临时数组最多只有一块大小，
+        不会在写入期间额外占用一份完整批量的内存。
+        """
+        self._ensure_writable()
+        for start in range(0, len(vectors), _ADD_CHUNK_SIZE):
+            chunk = self._normalize(vectors[start:start + _ADD_CHUNK_SIZE])
+            self.index.add(chunk)
+            if self._gpu_index is not None:
+                self._gpu_index.add(chunk)
+        self._maybe_train_index()
+        self._search_cache.clear()
+
+    def _train_threshold(self) -> int:
+        """训练所需的最少向量数：SQ8只需统计每个维度的取值范围，IVF/IVFPQ需要足够样本训练聚类中心"""
+        if self.index_type.lower() == "sq8":
+            return 1000
+        return max(10000, 39 * settings.FAISS_NLIST)
+
+    def _maybe_train_index(self):
+        """IVF/IVFPQ/SQ8预热阶段的Flat索引积累到足够向量后，用真实数据训练并替换"""
+        index_type = self.index_type.lower()
+        if index_type not in ("ivf", "ivfpq", "sq8") or not isinstance(self.index, faiss.IndexFlat):
+            return
+        if self.index.ntotal < self._train_threshold():
+            return
         
-        self.texts = []
+        logger.info(f"FAISS预热索引已有 {self.index.ntotal} 条向量，开始训练{index_type.upper()}索引")
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        metric = self.index.metric_type
+        if index_type == "sq8":
+            # 每个维度量化为8位整数，向量占用内存降为Flat的1/4，搜索仍是全量扫描
+            index = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, metric)
+        else:
+            quantizer = faiss.IndexFlat(self.dimension, metric)
+            if index_type == "ivfpq":
+                index = faiss.IndexIVFPQ(quantizer, self.dimension, settings.FAISS_NLIST, settings.FAISS_PQ_M, 8, metric)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, self.dimension, settings.FAISS_NLIST, metric)
+        index.train(vectors)
+        index.add(vectors)
+        self.index = index
+        self._configure_index()
+        logger.info(f"{index_type.upper()}索引训练完成，训练向量数={len(vectors)}")
 
+    @_write_locked
     def save_index(self):
         """保存索引到文件"""
+        return self._save_index()
+
+    def _save_index(self):
+        """保存索引到文件，调用方需持有写锁（后台保存线程持有读锁，同一时间只有它在保存）"""
         try:
-            # 确保目录存在
-            index_dir = os.path.dirname(self.index_path)
-            if index_dir and not os.path.exists(index_dir):
-                os.makedirs(index_dir)
-                
-            with open(self.index_path, 'wb') as f:
-                pickle.dump({'index': self.index, 'texts': self.texts}, f)
-            logger.info(f"FAISS索引已保存，包含 {len(self.texts)} 条记忆")
+            # 先写临时文件再替换，避免保存中断时损坏已有索引
+            tmp_path = self.faiss_path + ".tmp"
+            faiss.write_index(self.index, tmp_path)
+            os.replace(tmp_path, self.faiss_path)
+            self._write_texts()
+            self._unsaved = 0
+            self._update_size()
+            logger.info(f"FAISS索引已保存，包含 {len(self.records)} 条记忆")
             return True
         except Exception as e:
             logger.error(f"保存FAISS索引失败: {str(e)}", exc_info=True)
             return False
 
+    def _update_size(self):
+        """重新统计索引和记忆文本文件的总大小"""
+        size = 0
+        for path in (self.faiss_path, self.texts_path):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        self._size_mb = size / (1024 * 1024)
+
+    def _mark_dirty(self, count: int):
+        """记录未保存的写入并通知后台线程，调用方需持有写锁"""
+        self._unsaved += count
+        self._dirty.set()
+        if self._unsaved >= settings.FAISS_SAVE_BATCH:
+            self._batch_full.set()
+
+    def _persist_loop(self):
+        """后台保存线程：首次写入后最多等待 FAISS_SAVE_INTERVAL 秒，期间的写入合并为一次保存，
+        累计达到 FAISS_SAVE_BATCH 条时提前保存
+        
+        保存只读取索引，因此持有读锁，不阻塞并发的搜索；写入操作在保存期间等待。
+        """
+        while True:
+            self._dirty.wait()
+            self._batch_full.wait(settings.FAISS_SAVE_INTERVAL)
+            with self._rwlock.read_lock():
+                self._dirty.clear()
+                self._batch_full.clear()
+                if self._unsaved > 0:
+                    self._save_index()
+
+    @_write_locked
+    def flush(self) -> bool:
+        """立即保存尚未落盘的写入"""
+        if self._unsaved > 0:
+            return self._save_index()
+        return True
+
+    @_write_locked
     def add_text(self, text: str, embedding: np.ndarray, timestamp: str, conversation_id: int = None):
         """添加新的记忆到FAISS索引
         
@@ -81,53 +609,23 @@ class FAISSMemoryStore:
             logger.info(f"添加新记忆到FAISS，时间戳: {timestamp}, 对话ID: {conversation_id or '全局'}")
             logger.debug(f"记忆文本长度: {len(text)}, 向量维度: {embedding.shape if hasattr(embedding, 'shape') else 'unknown'}")
             
-            # 确保存储完整对话内容以及对话ID
-            self.texts.append({
-                "text": text,
-                "timestamp": timestamp,
-                "conversation_id": conversation_id
-            })
-            
-            # 确保embedding是正确的numpy数组格式
-            if not isinstance(embedding, np.ndarray):
-                logger.warning(f"向量不是numpy数组，正在转换，类型: {type(embedding)}")
-                embedding = np.array(embedding, dtype=np.float32)
-                
-            if len(embedding.shape) == 1:
-                embedding = embedding.reshape(1, -1)
-                
-            if embedding.dtype != np.float32:
-                embedding = embedding.astype(np.float32)
-                
-            # 检查维度
-            if embedding.shape[1] != self.dimension:
-                logger.warning(f"向量维度不匹配，预期: {self.dimension}, 实际: {embedding.shape[1]}")
-                if embedding.shape[1] > self.dimension:
-                    embedding = embedding[:, :self.dimension]
-                else:
-                    # 填充向量
-                    padding = np.zeros((1, self.dimension - embedding.shape[1]), dtype=np.float32)
-                    embedding = np.hstack((embedding, padding))
+            embedding = self._prepare_vectors(embedding)
+            self._append_record(text, timestamp, conversation_id)
                 
             # 添加到索引
-            self.index.add(embedding)
+            self._add_vectors(embedding)
             
-            # 每100个记忆保存一次索引，或总数量小于100时每次保存
-            total_memories = len(self.texts)
-            if total_memories % 100 == 0 or total_memories < 100:
-                save_success = self.save_index()
-                if save_success:
-                    logger.info(f"成功保存FAISS索引，总记忆数: {total_memories}")
-                else:
-                    logger.error(f"保存FAISS索引失败，总记忆数: {total_memories}")
+            # 累积写入，达到批量阈值或时间间隔后再保存索引
+            self._mark_dirty(1)
             
-            logger.info(f"已保存新记忆，当前共有 {len(self.texts)} 条记忆，对话ID: {conversation_id or '全局'}")
+            logger.info(f"已保存新记忆，当前共有 {len(self.records)} 条记忆，对话ID: {conversation_id or '全局'}")
             return True
             
         except Exception as e:
             logger.error(f"添加文本到FAISS索引失败: {str(e)}", exc_info=True)
             return False
             
+    @_write_locked
     def add_texts_batch(self, texts: List[str], embeddings: np.ndarray, timestamps: List[str], 
                         conversation_ids: List[Optional[int]] = None):
         """批量添加记忆到FAISS索引
@@ -147,41 +645,17 @@ class FAISSMemoryStore:
                 
             logger.info(f"批量添加 {len(texts)} 条记忆到FAISS")
             
-            # 确保embeddings是二维数组
-            if len(embeddings.shape) == 1:
-                embeddings = embeddings.reshape(1, -1)
-                
-            # 确保数据类型正确
-            if embeddings.dtype != np.float32:
-                embeddings = embeddings.astype(np.float32)
-                
-            # 检查维度
-            if embeddings.shape[1] != self.dimension:
-                logger.warning(f"批量向量维度不匹配，预期: {self.dimension}, 实际: {embeddings.shape[1]}")
-                if embeddings.shape[1] > self.dimension:
-                    embeddings = embeddings[:, :self.dimension]
-                else:
-                    # 填充向量
-                    padding = np.zeros((embeddings.shape[0], self.dimension - embeddings.shape[1]), dtype=np.float32)
-                    embeddings = np.hstack((embeddings, padding))
+            embeddings = self._prepare_vectors(embeddings)
             
             # 添加文本记录
-            for i, (text, timestamp, conv_id) in enumerate(zip(texts, timestamps, conversation_ids)):
-                self.texts.append({
-                    "text": text,
-                    "timestamp": timestamp,
-                    "conversation_id": conv_id
-                })
+            for text, timestamp, conv_id in zip(texts, timestamps, conversation_ids):
+                self._append_record(text, timestamp, conv_id)
                 
             # 添加到索引
-            self.index.add(embeddings)
+            self._add_vectors(embeddings)
             
-            # 保存索引
-            save_success = self.save_index()
-            if save_success:
-                logger.info(f"批量添加成功并保存索引，当前总记忆数: {len(self.texts)}")
-            else:
-                logger.error(f"批量添加成功但保存索引失败，当前总记忆数: {len(self.texts)}")
+            self._mark_dirty(len(texts))
+            logger.info(f"批量添加成功，当前总记忆数: {len(self.records)}")
                 
             return True
             
@@ -190,7 +664,7 @@ class FAISSMemoryStore:
             return False
 
     def search(self, query_embedding: np.ndarray, k=3, conversation_id: int = None) -> List[Memory]:
-        """搜索相似记忆
+        """搜索相似记忆，相同查询向量在记忆没有变化时直接返回缓存的结果
         
         Args:
             query_embedding: 查询向量
@@ -200,98 +674,108 @@ class FAISSMemoryStore:
         Returns:
             List[Memory]: 相似记忆列表
         """
+        cache_key = None
+        if self._search_cache.maxsize > 0:
+            query = self._prepare_vectors(query_embedding)
+            cache_key = _SearchCache.key(query, k, conversation_id)
+            cached = self._search_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"FAISS搜索命中缓存: k={k}, 对话ID={conversation_id or '全部'}, 返回 {len(cached)} 条记忆")
+                return cached
+            generation = self._search_cache.generation
+            query_embedding = query
+        
+        results = self.search_batch(query_embedding, k=k, conversation_id=conversation_id)
+        results = results[0] if results else []
+        if cache_key is not None:
+            self._search_cache.put(cache_key, results, generation)
+        return results
+
+    @_read_locked
+    def search_batch(self, query_embeddings: np.ndarray, k=3, conversation_id: int = None) -> List[List[Memory]]:
+        """批量搜索相似记忆，多个查询向量合并为一次FAISS搜索
+        
+        Args:
+            query_embeddings: 查询向量矩阵（M×d），一维数组视为单个查询
+            k: 每个查询返回的结果数量
+            conversation_id: 限定搜索范围的对话ID，None表示搜索全部
+            
+        Returns:
+            List[List[Memory]]: 与查询向量一一对应的相似记忆列表
+        """
+        # 一维数组视为单个查询
+        query_count = 1 if np.ndim(query_embeddings) == 1 else len(query_embeddings)
+        
         if self.index.ntotal == 0:
             logger.info("FAISS索引为空，无法搜索")
-            return []
+            return [[] for _ in range(query_count)]
             
-        logger.info(f"FAISS搜索: k={k}, 对话ID={conversation_id or '全部'}, 索引大小={self.index.ntotal}")
+        logger.info(f"FAISS搜索: 查询数={query_count}, k={k}, 对话ID={conversation_id or '全部'}, 索引大小={self.index.ntotal}")
         
         try:
-            # 确保查询向量的维度正确
-            original_shape = query_embedding.shape
-            
-            # 如果是1D数组，转换为2D
-            if len(original_shape) == 1:
-                logger.debug(f"将1D查询向量 {original_shape} 转换为2D")
-                query_embedding = query_embedding.reshape(1, -1)
-                
-            # 检查维度并处理不匹配情况
-            if query_embedding.shape[1] != self.dimension:
-                logger.warning(f"查询向量维度不匹配。预期: {self.dimension}, 实际: {query_embedding.shape[1]}")
-                
-                # 尝试调整维度
-                if query_embedding.shape[1] > self.dimension:
-                    # 截断维度
-                    logger.info(f"截断查询向量维度从 {query_embedding.shape[1]} 到 {self.dimension}")
-                    query_embedding = query_embedding[:, :self.dimension]
-                else:
-                    # 填充维度
-                    logger.info(f"填充查询向量维度从 {query_embedding.shape[1]} 到 {self.dimension}")
-                    padding = np.zeros((1, self.dimension - query_embedding.shape[1]), dtype=np.float32)
-                    query_embedding = np.hstack((query_embedding, padding))
-            
-            # 确保数据类型正确
-            if query_embedding.dtype != np.float32:
-                logger.debug(f"将查询向量类型从 {query_embedding.dtype} 转换为 float32")
-                query_embedding = query_embedding.astype(np.float32)
+            query_embeddings = self._normalize(self._prepare_vectors(query_embeddings))
             
             # 搜索最相似的k个向量
-            search_k = min(k * 3, self.index.ntotal)  # 多搜索一些，后面可能会过滤
-            logger.debug(f"FAISS搜索 k={search_k} (原始k={k})")
-            
-            distances, indices = self.index.search(query_embedding, search_k)
-            
-            # 预处理结果
-            search_results = []
-            
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.texts) and idx >= 0:
-                    text = self.texts[idx]["text"]
-                    timestamp = self.texts[idx]["timestamp"]
-                    item_conversation_id = self.texts[idx].get("conversation_id")
-                    
-                    # 将L2距离转换为相似度分数（0-1之间）
-                    distance = distances[0][i]
-                    similarity = 1.0 / (1.0 + distance)
-                    
-                    # 如果指定了对话ID，只返回对应对话的记忆
-                    if conversation_id is not None and item_conversation_id != conversation_id:
-                        logger.debug(f"跳过不匹配对话ID的记忆: {timestamp}, 对话ID={item_conversation_id}")
-                        continue
-                        
-                    # 解析存储的文本
-                    parts = text.split("\n助手: ")
-                    if len(parts) == 2:
-                        user_message = parts[0].replace("用户: ", "")
-                        ai_response = parts[1]
-                        
-                        memory = Memory(
-                            user_message=user_message,
-                            ai_response=ai_response,
-                            timestamp=timestamp,
-                            similarity=similarity,
-                            conversation_id=item_conversation_id
-                        )
-                        search_results.append(memory)
-                        
-                        logger.debug(f"FAISS找到记忆: {timestamp}, 相似度={similarity:.4f}, 距离={distance:.4f}")
+            # 指定对话ID时只在该对话的记忆中搜索，直接返回该对话中最相似的k条
+            if conversation_id is not None:
+                ids = self._conversation_indices(conversation_id)
+                if len(ids) == 0:
+                    logger.info(f"对话 {conversation_id} 没有记忆，跳过搜索")
+                    return [[] for _ in range(query_count)]
+                search_k = min(k, len(ids))
+                logger.debug(f"FAISS搜索 k={search_k}，限定对话 {conversation_id} 的 {len(ids)} 条记忆")
+                distances, indices = self._search_filtered(query_embeddings, ids, search_k)
+            else:
+                search_k = min(k, self.index.ntotal)
+                logger.debug(f"FAISS搜索 k={search_k}")
+                if self._gpu_index is not None:
+                    with self._gpu_lock:
+                        distances, indices = self._gpu_index.search(query_embeddings, search_k)
                 else:
-                    logger.warning(f"FAISS索引不匹配: {idx} >= {len(self.texts)} 或 {idx} < 0")
-            
-            # 按相似度从高到低排序
-            search_results.sort(key=lambda x: x.similarity, reverse=True)
-            
-            # 限制返回数量
-            final_results = search_results[:k]
+                    distances, indices = self.index.search(query_embeddings, search_k)
+            
+            # 内积索引的得分即余弦相似度，L2距离转换为相似度分数（0-1之间）
+            similarities = distances if self._uses_inner_product() else 1.0 / (1.0 + distances)
+            
+            # 先在数组上筛掉无效下标：结果不足k条时FAISS以-1填充，超出记忆条数说明索引与记录不一致
+            records = self.records
+            out_of_range = indices >= len(records)
+            if out_of_range.any():
+                logger.warning(f"FAISS索引不匹配: {int(out_of_range.sum())} 个结果下标超出记忆条数 {len(records)}")
+            valid = (indices >= 0) & ~out_of_range
+            
+            all_results = []
+            for row in range(query_count):
+                row_valid = valid[row]
+                search_results = []
+                for idx, similarity, distance in zip(indices[row][row_valid].tolist(),
+                                                     similarities[row][row_valid].tolist(),
+                                                     distances[row][row_valid].tolist()):
+                    # 跳过无法解析的旧格式记录
+                    if not records.is_parsed(idx):
+                        continue
+                    timestamp = records.timestamps[idx]
+                    search_results.append(Memory(
+                        user_message=records.user_messages[idx],
+                        ai_response=records.ai_responses[idx],
+                        timestamp=timestamp,
+                        similarity=similarity,
+                        conversation_id=records.conversation_id(idx)
+                    ))
+                    logger.debug(f"FAISS找到记忆: {timestamp}, 相似度={similarity:.4f}, 距离={distance:.4f}")
+                
+                # FAISS按距离返回且最多 search_k <= k 条，结果已按相似度从高到低排列，无需再排序截断
+                all_results.append(search_results)
             
-            logger.info(f"FAISS搜索完成: 找到 {len(final_results)}/{len(search_results)} 条相关记忆")
+            logger.info(f"FAISS搜索完成: 找到 {sum(len(r) for r in all_results)} 条相关记忆")
             
-            return final_results
+            return all_results
             
         except Exception as e:
             logger.error(f"FAISS搜索失败: {str(e)}", exc_info=True)
-            return []
+            return [[] for _ in range(query_count)]
 
+    @_write_locked
     def clear_memory(self, conversation_id: Optional[int] = None):
         """清除记忆数据
         
@@ -300,40 +784,47 @@ class FAISSMemoryStore:
         """
         if conversation_id is None:
             # 清除所有记忆
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.texts = []
-            if os.path.exists(self.index_path):
-                os.remove(self.index_path)
+            self._create_new_index()
+            for path in (self.faiss_path, self.texts_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._unsaved = 0
+            self._texts_synced = 0
+            self._size_mb = 0.0
             logger.info("已清除所有FAISS记忆数据")
         else:
-            # 只清除指定对话的记忆
-            # 需要重建索引，先找出要保留的记忆
-            retained_texts = []
-            retained_embeddings = []
-            
-            for i, item in enumerate(self.texts):
-                item_conversation_id = item.get("conversation_id")
-                # 保留不匹配的对话ID或全局记忆(None)
-                if item_conversation_id != conversation_id:
-                    retained_texts.append(item)
-                    
-                    # 从FAISS索引中获取对应的向量
-                    if i < self.index.ntotal:
-                        vector = np.array([self.index.reconstruct(i)])  # 获取原始向量
-                        retained_embeddings.append(vector)
-            
-            # 创建新索引并添加保留的向量
-            self._create_new_index()
-            if retained_embeddings:
-                retained_embeddings = np.vstack(retained_embeddings)
-                self.index.add(retained_embeddings)
+            # 只清除指定对话的记忆，用对话ID编码列得到保留掩码
+            code = self.records.code_of(conversation_id)
+            keep = self.records.conv_codes != code if code is not None else None
+            if keep is None or keep.all():
+                logger.info(f"对话 {conversation_id} 没有FAISS记忆，无需清除")
+                return
+            
+            retained_records = self.records.take(keep)
+            
+            if isinstance(self.index, faiss.IndexFlatCodes) and self.index.ntotal == len(self.records):
+                # Flat/SQ8索引删除向量后会压缩存储，剩余向量的ID仍与记录下标一一对应，直接原地删除
+                self.index.remove_ids(faiss.IDSelectorBatch(np.flatnonzero(~keep).astype(np.int64)))
+                self._sync_gpu_index()
+                self._search_cache.clear()
+            else:
+                # IVF删除后ID不连续，HNSW不支持删除：取出保留的向量重建索引
+                vector_count = min(len(self.records), self.index.ntotal)
+                retained_embeddings = self.index.reconstruct_n(0, vector_count)[keep[:vector_count]]
+                
+                self._create_new_index()
+                if len(retained_embeddings):
+                    self._add_vectors(np.ascontiguousarray(retained_embeddings))
             
-            # 更新文本记录
-            self.texts = retained_texts
-            self.save_index()
+            # 更新文本记录，JSONL 需要整体重写
+            self.records = retained_records
+            self._reset_caches()
+            self._texts_synced = 0
+            self._save_index()
             
-            logger.info(f"已清除对话 {conversation_id} 的FAISS记忆数据，保留 {len(retained_texts)} 条记忆")
+            logger.info(f"已清除对话 {conversation_id} 的FAISS记忆数据，保留 {len(retained_records)} 条记忆")
 
+    @_read_locked
     def get_memory_by_timestamp(self, timestamp: str) -> Optional[Memory]:
         """根据时间戳获取完整记忆
         
@@ -343,43 +834,33 @@ class FAISSMemoryStore:
         Returns:
             Optional[Memory]: 找到的记忆对象，未找到则返回None
         """
-        for item in self.texts:
-            if item.get("timestamp") == timestamp:
-                text = item["text"]
-                conversation_id = item.get("conversation_id")
-                parts = text.split("\n助手: ")
-                if len(parts) == 2:
-                    user_message = parts[0].replace("用户: ", "")
-                    ai_response = parts[1]
-                    return Memory(
-                        user_message=user_message,
-                        ai_response=ai_response,
-                        timestamp=timestamp,
-                        conversation_id=conversation_id
-                    )
-        return None
+        idx = self._ts_to_idx.get(timestamp)
+        if idx is None:
+            return None
+        return Memory(
+            user_message=self.records.user_messages[idx],
+            ai_response=self.records.ai_responses[idx],
+            timestamp=timestamp,
+            conversation_id=self.records.conversation_id(idx)
+        )
 
+    @_read_locked
     def get_statistics(self) -> Dict[str, Any]:
         """获取FAISS存储统计信息"""
         stats = {
-            "count": len(self.texts),
-            "size_mb": 0,
+            "count": len(self.records),
+            "size_mb": self._size_mb,
             "conversation_counts": {}
         }
         
-        # 统计每个对话的记忆数量
-        for item in self.texts:
-            conversation_id = item.get("conversation_id") or "global"
-            if conversation_id in stats["conversation_counts"]:
-                stats["conversation_counts"][conversation_id] += 1
-            else:
-                stats["conversation_counts"][conversation_id] = 1
-        
-        if os.path.exists(self.index_path):
-            stats["size_mb"] = os.path.getsize(self.index_path) / (1024 * 1024)
+        # 统计每个对话的记忆数量，计数在对话ID编码列上完成
+        for conversation_id, count in self.records.conversation_counts().items():
+            key = conversation_id or "global"
+            stats["conversation_counts"][key] = stats["conversation_counts"].get(key, 0) + count
         
         return stats
 
+    @_read_locked
     def get_paged_memories(self, page: int = 1, page_size: int = 10, 
                           sort_by: str = "timestamp", sort_desc: bool = True,
                           conversation_id: Optional[str] = None) -> Dict[str, Any]:
@@ -395,7 +876,7 @@ class FAISSMemoryStore:
         Returns:
             Dict: 包含分页数据和分页信息
         """
-        if not self.texts:
+        if not len(self.records):
             return {
                 "items": [],
                 "total": 0,
@@ -418,45 +899,22 @@ class FAISSMemoryStore:
         if page_size > max_page_size:
             page_size = max_page_size
             
-        # 创建全部记忆的列表并提取信息
-        memories = []
-        for item in self.texts:
-            # 如果指定了对话ID过滤，则跳过不匹配的记忆
-            if conversation_id is not None and item.get("conversation_id") != conversation_id:
-                continue
-                
-            text = item["text"]
-            timestamp = item["timestamp"]
-            item_conversation_id = item.get("conversation_id")
-            parts = text.split("\n助手: ")
-            
-            if len(parts) == 2:
-                user_message = parts[0].replace("用户: ", "")
-                ai_response = parts[1]
-                
-                memory = {
-                    "user_message": user_message,
-                    "ai_response": ai_response,
-                    "timestamp": timestamp,
-                    "conversation_id": item_conversation_id
-                }
-                memories.append(memory)
-        
         # 按指定字段排序
         if sort_by not in ["timestamp"]:  # 目前只支持按时间戳排序
             sort_by = "timestamp"
-            
-        memories.sort(key=lambda x: x[sort_by], reverse=sort_desc)
+        
+        # 使用缓存的时间戳排序结果，只为当前页的记录构建字典
+        order = self._get_page_order(conversation_id, sort_desc)
         
         # 计算分页信息
-        total = len(memories)
+        total = len(order)
         total_pages = (total + page_size - 1) // page_size
         
         # 获取当前页的数据
         start_idx = (page - 1) * page_size
         end_idx = min(start_idx + page_size, total)
         
-        page_items = memories[start_idx:end_idx] if start_idx < total else []
+        page_items = [self.records.to_dict(idx) for idx in order[start_idx:end_idx].tolist()]
         
         return {
             "items": page_items,
@@ -467,5 +925,19 @@ class FAISSMemoryStore:
             "conversation_id": conversation_id
         }
 
+def _configure_faiss_threads():
+    """按物理核心数设置FAISS的OpenMP线程数，并记录FAISS编译时启用的SIMD指令集
+    
+    x86 平台的 faiss-cpu 会按CPU支持情况加载 AVX2/AVX512 内核，ARM 平台使用 NEON，
+    编译选项中不会出现 AVX 字样。
+    """
+    physical_cores = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    threads = settings.FAISS_THREADS
+    threads = min(threads, physical_cores) if threads > 0 else physical_cores
+    faiss.omp_set_num_threads(threads)
+    logger.info(f"FAISS编译选项: {faiss.get_compile_options().strip()}, OpenMP线程数: {threads}")
+
+_configure_faiss_threads()
+
 # 创建全局FAISS存储实例
 memory_store = FAISSMemoryStore() 
\ No newline at end of file
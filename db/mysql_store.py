@@ -1,18 +1,166 @@
 import os
+import csv
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 import mysql.connector
-from mysql.connector import pooling
-from typing import List, Dict, Any, Optional, Tuple
-import json
-from datetime import datetime
+from mysql.connector import pooling, errorcode
+from mysql.connector.errors import PoolError
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
 from utils.logger import logger
+from utils import fastjson
 from core.config import settings
+from db import schema
+
+# 查询返回的列，显式列出而不是 SELECT *，表结构增加列时不会多传数据
+_CONVERSATION_COLUMNS = "id, title, created_at, updated_at, settings, description, message_count, last_activity, files"
+_MESSAGE_COLUMNS = "id, conversation_id, timestamp, user_message, ai_response, tokens_input, tokens_output, cost, created_at"
+
+# 多行 INSERT 每条语句包含的最大行数，避免单条语句超过 max_allowed_packet
+_INSERT_CHUNK_SIZE = 100
+
+# 流式读取时每次从服务端取回的行数
+_STREAM_BATCH_SIZE = 500
+
+# 分块删除消息时每条 DELETE 删除的最大行数，避免长时间持有行锁和产生过大的 binlog 事件
+_DELETE_CHUNK_SIZE = 1000
+
+# 保存单条消息的存储过程，过程体变化时递增名称中的版本号，旧版本的过程不会被误用
+_SAVE_MESSAGE_PROCEDURE = "neko_save_message_v2"
+
+# 连接池耗尽且临时连接名额用完时，等待期间重试连接池的间隔（秒）
+_POOL_RETRY_INTERVAL = 0.05
+
+# 空 settings/metadata 的 JSON 文本，省去序列化；JSON 列不接受二进制参数，因此是 str
+_EMPTY_JSON = "{}"
+
+def _dump_json(obj: Any) -> str:
+    """序列化 settings/metadata 等 JSON 列的值
+    
+    使用 fastjson（orjson）序列化；JSON 列不接受二进制字符集的参数，因此解码为 str 传入。
+    """
+    return fastjson.dumps(obj).decode("utf-8")
+
+def _parse_settings(raw) -> Dict:
+    """解析对话的 settings JSON
+    
+    每次调用都重新解析，返回的字典归调用方所有。不按原始文本缓存解析结果：settings 中可能有嵌套的
+    字典和列表，缓存后需要深拷贝才能避免调用方修改缓存，而 orjson 重新解析比深拷贝更快。
+    """
+    return fastjson.loads(raw)
+
+def _parse_files(raw) -> List[str]:
+    """解析对话关联的文件ID列表（files JSON 列），未设置时为空列表"""
+    if not raw:
+        return []
+    return fastjson.loads(raw)
+
+def _write_messages_csv(f, conversation_id: int, messages: List[Dict[str, Any]]) -> None:
+    """按 bulk_import_messages 中 LOAD DATA 的格式写出消息：字段逗号分隔、双引号包围、反斜杠转义，每行以 \\n 结尾"""
+    writer = csv.writer(f, quoting=csv.QUOTE_ALL, doublequote=False, escapechar="\\", lineterminator="\n")
+    for message in messages:
+        writer.writerow((
+            conversation_id, message["timestamp"], message["user_message"], message["ai_response"],
+            message.get("tokens_input", 0), message.get("tokens_output", 0), message.get("cost", 0),
+            _dump_json(message["metadata"]) if message.get("metadata") else _EMPTY_JSON
+        ))
+
+class _ConversationCache:
+    """按对话ID缓存对话信息的线程安全 TTL + LRU 缓存
+    
+    ttl 不大于 0 时不缓存。写入对话或消息后调用 invalidate 使对应条目失效并递增版本号；
+    查询前记下版本号，写入缓存时版本号已变化则放弃，避免与写入交错的查询把过期结果放回缓存。
+    多进程部署时其他进程的写入不会使本进程的缓存失效，最多读到 ttl 秒前的数据。
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._data: "OrderedDict[int, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _copy(conversation: Dict) -> Dict:
+        # 调用方可能修改返回的字典及其中的 settings，缓存中保存和返回的都是副本
+        copied = dict(conversation)
+        if isinstance(copied.get("settings"), dict):
+            copied["settings"] = dict(copied["settings"])
+        if isinstance(copied.get("files"), list):
+            copied["files"] = list(copied["files"])
+        return copied
+    
+    def get(self, conversation_id: int) -> Optional[Dict]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                return None
+            expires_at, conversation = entry
+            if expires_at <= time.monotonic():
+                del self._data[conversation_id]
+                return None
+            self._data.move_to_end(conversation_id)
+        return self._copy(conversation)
+    
+    def put(self, conversation_id: int, conversation: Dict, generation: int) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._data[conversation_id] = (time.monotonic() + self.ttl, self._copy(conversation))
+            self._data.move_to_end(conversation_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, conversation_id: int) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self.generation += 1
+            self._data.pop(conversation_id, None)
+
+class _OverflowConnection:
+    """连接池耗尽时临时创建的独立连接，close() 时归还占用的临时连接名额，其余属性转发给实际连接"""
+    
+    def __init__(self, conn, slots: threading.BoundedSemaphore):
+        self._conn = conn
+        self._slots = slots
+        self._released = False
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def close(self):
+        try:
+            self._conn.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._slots.release()
 
 class MySQLStore:
     """MySQL数据存储类，处理MySQL数据库连接和操作"""
     
     def __init__(self):
         """初始化MySQL连接池"""
+        # 当前线程正在使用的会话连接，见 _session
+        self._local = threading.local()
+        # 存储过程是否可用，建表时检查和创建，不可用时 save_message 逐条执行语句
+        self._save_message_procedure = False
+        # uk_conv_ts 唯一索引是否可用，旧表中有重复消息导致无法添加时，写入前需要查询去重
+        self._unique_timestamps = True
+        # 连接池耗尽时可临时创建的独立连接名额
+        self._overflow = threading.BoundedSemaphore(max(0, settings.MYSQL_POOL_OVERFLOW))
+        # 对话信息缓存，MYSQL_CONVERSATION_CACHE_TTL 为 0 时不缓存
+        self._conversation_cache = _ConversationCache(
+            settings.MYSQL_CONVERSATION_CACHE_SIZE, settings.MYSQL_CONVERSATION_CACHE_TTL
+        )
         try:
             # 从配置中获取数据库连接信息
             self.db_config = {
@@ -27,15 +175,31 @@ class MySQLStore:
             
             # 加入数据库名称，创建正式连接池
             self.db_config['database'] = settings.MYSQL_DATABASE
-            
-            # 创建连接池
+            # 连接使用自动提交，只读查询不会留下未结束的事务（及其一致性读快照），
+            # 需要多条语句原子执行的写操作显式调用 start_transaction()
+            self.db_config['autocommit'] = True
+            # mysql-connector 默认在已安装 C 扩展时使用基于 libmysqlclient 的 C 实现解析协议包，
+            # 开启 MYSQL_USE_PURE 可强制回退到纯 Python 实现
+            if settings.MYSQL_USE_PURE:
+                self.db_config['use_pure'] = True
+            elif not mysql.connector.HAVE_CEXT:
+                logger.warning("未安装 mysql-connector 的 C 扩展，使用较慢的纯 Python 实现")
+            
+            # 创建连接池，大小受 mysql-connector 上限限制
+            pool_size = max(1, min(settings.MYSQL_POOL_SIZE, pooling.CNX_POOL_MAXSIZE))
+            if pool_size != settings.MYSQL_POOL_SIZE:
+                logger.warning(f"MySQL连接池大小 {settings.MYSQL_POOL_SIZE} 超出范围，调整为 {pool_size}")
+            
+            # 本类不修改会话变量，且连接为自动提交，归还连接时无需重置会话，省去每次归还的一次往返
             self.pool = mysql.connector.pooling.MySQLConnectionPool(
-                pool_name="mysql_pool",
-                pool_size=5,
+                pool_name=f"mysql_pool_{os.getpid()}",
+                pool_size=pool_size,
+                pool_reset_session=False,
                 **self.db_config
             )
             
-            logger.info("MySQL连接池初始化成功")
+            logger.info(f"MySQL连接池初始化成功，连接数: {pool_size}，"
+                        f"实现: {'C 扩展' if mysql.connector.HAVE_CEXT and not settings.MYSQL_USE_PURE else '纯 Python'}")
             
             # 初始化数据库表
             self._init_tables()
@@ -58,15 +222,8 @@ class MySQLStore:
             )
             cursor = conn.cursor()
             
-            # 检查数据库是否存在
             db_name = settings.MYSQL_DATABASE
-            cursor.execute(f"SHOW DATABASES LIKE '{db_name}'")
-            result = cursor.fetchone()
-            
-            if not result:
-                logger.info(f"数据库 {db_name} 不存在，正在创建...")
-                cursor.execute(f"CREATE DATABASE {db_name} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-                conn.commit()
+            if schema.create_database(cursor, db_name):
                 logger.info(f"数据库 {db_name} 创建成功")
             else:
                 logger.info(f"数据库 {db_name} 已存在")
@@ -80,128 +237,237 @@ class MySQLStore:
             if conn:
                 conn.close()
     
+    def _get_connection(self):
+        """从连接池获取连接
+        
+        mysql-connector 的连接池耗尽时不会等待而是直接抛出 PoolError。此时最多临时创建
+        MYSQL_POOL_OVERFLOW 个独立连接；名额也用完时等待连接归还或名额释放，
+        MYSQL_POOL_TIMEOUT 秒内仍未取得连接则抛出 PoolError。调用方用完照常 close() 即可。
+        """
+        deadline = time.monotonic() + settings.MYSQL_POOL_TIMEOUT
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                pass
+            remaining = deadline - time.monotonic()
+            if self._overflow.acquire(timeout=max(0.0, min(remaining, _POOL_RETRY_INTERVAL))):
+                break
+            if remaining <= 0:
+                raise PoolError(f"MySQL连接池已耗尽，{settings.MYSQL_POOL_TIMEOUT} 秒内未取得连接"
+                                f"（临时连接上限 {settings.MYSQL_POOL_OVERFLOW}）")
+        
+        logger.warning("MySQL连接池已耗尽，临时创建独立连接")
+        try:
+            return _OverflowConnection(mysql.connector.connect(**self.db_config), self._overflow)
+        except Exception:
+            self._overflow.release()
+            raise
+    
+    @contextmanager
+    def _session(self, dictionary: bool = False, transaction: bool = False):
+        """以一个工作单元为范围获取连接和游标：with self._session() as (conn, cursor)
+        
+        同一线程内嵌套的会话复用最外层的连接，整个工作单元只从连接池取一次连接；
+        游标和连接在退出时关闭，出现异常时回滚并重新抛出。
+        
+        Args:
+            dictionary: 是否使用字典游标
+            transaction: 是否在事务中执行，正常退出时提交；已处于事务中时加入外层事务
+        """
+        outer = getattr(self._local, "conn", None)
+        conn = outer or self._get_connection()
+        if outer is None:
+            self._local.conn = conn
+        cursor = conn.cursor(dictionary=dictionary)
+        started = transaction and not conn.in_transaction
+        try:
+            if started:
+                conn.start_transaction()
+            yield conn, cursor
+            # 调用方可能已自行回滚，此时无需再提交
+            if started and conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if outer is None:
+                conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            if outer is None:
+                self._local.conn = None
+                conn.close()
+    
     def _init_tables(self):
         """初始化必要的数据库表"""
         try:
-            # 获取连接
-            conn = self.pool.get_connection()
-            cursor = conn.cursor()
-            
-            # 创建对话表
-            try:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        title VARCHAR(255) NOT NULL,
-                        created_at DATETIME NOT NULL,
-                        updated_at DATETIME NOT NULL,
-                        settings JSON,
-                        description TEXT
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                logger.info("对话表初始化成功")
-            except Exception as e:
-                logger.error(f"创建对话表失败: {str(e)}")
-                # 继续尝试创建其他表
-            
-            # 创建对话消息表
-            try:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS conversation_messages (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        conversation_id INT NOT NULL,
-                        timestamp VARCHAR(50) NOT NULL,
-                        user_message TEXT NOT NULL,
-                        ai_response TEXT NOT NULL,
-                        tokens_input INT,
-                        tokens_output INT,
-                        cost FLOAT,
-                        created_at DATETIME NOT NULL,
-                        metadata JSON,
-                        INDEX (conversation_id, timestamp)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                logger.info("对话消息表初始化成功")
+            with self._session() as (conn, cursor):
+                # 创建对话表
+                try:
+                    cursor.execute(schema.CONVERSATIONS_DDL)
+                    logger.info("对话表初始化成功")
+                except Exception as e:
+                    logger.error(f"创建对话表失败: {str(e)}")
+                    # 继续尝试创建其他表
                 
-                # 单独添加外键约束
+                # 创建对话消息表
                 try:
-                    # 检查是否已存在约束
-                    cursor.execute("""
-                        SELECT COUNT(*)
-                        FROM information_schema.TABLE_CONSTRAINTS 
-                        WHERE CONSTRAINT_SCHEMA = %s 
-                        AND CONSTRAINT_NAME = 'fk_conversation_id'
-                    """, (settings.MYSQL_DATABASE,))
-                    
-                    constraint_exists = cursor.fetchone()[0] > 0
-                    
-                    if constraint_exists:
-                        logger.info("外键约束已存在，跳过添加")
-                    else:
-                        cursor.execute("""
-                            ALTER TABLE conversation_messages
-                            ADD CONSTRAINT fk_conversation_id
-                            FOREIGN KEY (conversation_id) REFERENCES conversations(id) 
-                            ON DELETE CASCADE
-                        """)
-                        logger.info("对话消息表外键约束添加成功")
+                    cursor.execute(schema.CONVERSATION_MESSAGES_DDL)
+                    logger.info("对话消息表初始化成功")
+                    schema.ensure_foreign_key(cursor)
                 except Exception as e:
-                    logger.warning(f"添加外键约束失败 (这可能是正常的，如果约束已存在): {str(e)}")
-                    # 不中断流程
-            except Exception as e:
-                logger.error(f"创建对话消息表失败: {str(e)}")
+                    logger.error(f"创建对话消息表失败: {str(e)}")
+                
+                self._unique_timestamps = schema.migrate(cursor)
+                # 存储过程依赖唯一索引去重，唯一索引不可用时逐条执行语句
+                self._save_message_procedure = (self._unique_timestamps
+                                                and self._ensure_save_message_procedure(cursor))
             
-            conn.commit()
             logger.info("数据库表初始化成功")
             
         except Exception as e:
             logger.error(f"数据库表初始化失败: {str(e)}")
             raise
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
     
-    def execute_query(self, query: str, params: Optional[tuple] = None, fetch: Optional[str] = None) -> Any:
+    @staticmethod
+    def _ensure_save_message_procedure(cursor) -> bool:
+        """创建 save_message 使用的存储过程
+        
+        过程在一个服务端事务中完成插入和对话计数更新，返回状态：1 已插入，0 消息已存在，-1 对话不存在。
+        没有 CREATE ROUTINE 权限等导致创建失败时返回 False。
+        """
+        try:
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.ROUTINES
+                WHERE ROUTINE_SCHEMA = %s AND ROUTINE_NAME = %s AND ROUTINE_TYPE = 'PROCEDURE'
+            """, (settings.MYSQL_DATABASE, _SAVE_MESSAGE_PROCEDURE))
+            
+            if cursor.fetchone()[0] > 0:
+                return True
+            
+            cursor.execute(f"""
+                CREATE PROCEDURE {_SAVE_MESSAGE_PROCEDURE}(
+                    IN p_conversation_id INT, IN p_timestamp VARCHAR(50),
+                    IN p_user_message TEXT, IN p_ai_response TEXT,
+                    IN p_tokens_input INT, IN p_tokens_output INT, IN p_cost FLOAT, IN p_metadata JSON
+                )
+                BEGIN
+                    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+                    BEGIN
+                        ROLLBACK;
+                        RESIGNAL;
+                    END;
+                    
+                    START TRANSACTION;
+                    INSERT INTO conversation_messages
+                    (conversation_id, timestamp, user_message, ai_response, tokens_input,
+                    tokens_output, cost, created_at, metadata)
+                    SELECT c.id, p_timestamp, p_user_message, p_ai_response, p_tokens_input,
+                    p_tokens_output, p_cost, NOW(), p_metadata
+                    FROM conversations c
+                    WHERE c.id = p_conversation_id
+                    ON DUPLICATE KEY UPDATE conversation_messages.id = conversation_messages.id;
+                    
+                    IF ROW_COUNT() > 0 THEN
+                        UPDATE conversations
+                        SET updated_at = NOW(), last_activity = NOW(), message_count = message_count + 1
+                        WHERE id = p_conversation_id;
+                        COMMIT;
+                        SELECT 1;
+                    ELSE
+                        ROLLBACK;
+                        SELECT IF(EXISTS(SELECT 1 FROM conversations WHERE id = p_conversation_id), 0, -1);
+                    END IF;
+                END
+            """)
+            logger.info(f"存储过程 {_SAVE_MESSAGE_PROCEDURE} 创建成功")
+            return True
+        except Exception as e:
+            # 多个进程同时启动时可能由其他进程先创建
+            if getattr(e, "errno", None) == errorcode.ER_SP_ALREADY_EXISTS:
+                return True
+            logger.warning(f"创建存储过程 {_SAVE_MESSAGE_PROCEDURE} 失败，保存消息将逐条执行语句: {str(e)}")
+            return False
+    
+    def execute_query(self, query: str, params: Optional[tuple] = None, fetch: Optional[str] = None,
+                      dictionary: bool = True) -> Any:
         """执行SQL查询
         
         Args:
             query: SQL查询语句
             params: 查询参数
-            fetch: 获取结果的方式 ('one', 'all', 'none')
+            fetch: 获取结果的方式 ('one', 'all', 'stream', 'none')，
+                   'stream' 返回逐行产出结果的迭代器，见 _iter_query
+            dictionary: 结果行是否为字典；只需要标量或不取结果时传 False，省去每行构建字典的开销，
+                        'stream' 始终返回字典
             
         Returns:
             查询结果或None
         """
-        conn = None
-        cursor = None
+        if fetch == 'stream':
+            return self._iter_query(query, params)
+        
         try:
-            conn = self.pool.get_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            cursor.execute(query, params or ())
-            
-            if fetch == 'one':
-                result = cursor.fetchone()
-            elif fetch == 'all':
-                result = cursor.fetchall()
-            else:
-                conn.commit()
-                result = None
+            # 连接为自动提交，写操作无需单独提交；在外层事务中调用时随外层事务提交
+            with self._session(dictionary=dictionary) as (conn, cursor):
+                cursor.execute(query, params or ())
                 
-            return result
+                if fetch == 'one':
+                    return cursor.fetchone()
+                elif fetch == 'all':
+                    return cursor.fetchall()
+                return None
             
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"SQL查询执行失败: {str(e)}, Query: {query}")
             raise
+    
+    def _iter_query(self, query: str, params: Optional[tuple] = None) -> Iterator[Dict]:
+        """用非缓冲游标执行查询，每次取回 _STREAM_BATCH_SIZE 行并逐行产出
+        
+        结果集不会整体载入内存。迭代期间独占一个连接，且不登记为当前线程的会话，
+        调用方在迭代过程中执行的其他查询会使用别的连接。
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(_STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        except Exception as e:
+            logger.error(f"SQL流式查询失败: {str(e)}, Query: {query}")
+            raise
         finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+            # 迭代提前结束时先读完剩余结果，连接才能继续使用
+            conn.consume_results()
+            cursor.close()
+            conn.close()
+    
+    @staticmethod
+    def _executemany_bulk(cursor, query: str, rows: List[tuple]) -> int:
+        """分块批量执行同一条语句
+        
+        mysql-connector 的 executemany 会把 INSERT ... VALUES 改写为一条多行 INSERT，
+        每块只需一次往返；分块是为了让单条语句不超过 max_allowed_packet。
+        预编译游标（prepared=True）不做这种改写，因此批量写入使用普通游标。
+        
+        Args:
+            cursor: 调用方事务中的游标
+            query: 单行形式的SQL语句
+            rows: 参数列表
+            
+        Returns:
+            int: 各块影响行数之和
+        """
+        affected = 0
+        for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+            cursor.executemany(query, rows[start:start + _INSERT_CHUNK_SIZE])
+            affected += cursor.rowcount
+        return affected
     
     def create_conversation(self, title: str, description: str = "", settings: Dict = None) -> int:
         """创建新的对话
@@ -215,25 +481,19 @@ class MySQLStore:
             int: 创建的对话ID，如果失败返回0
         """
         try:
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            settings_json = json.dumps(settings or {})
+            settings_json = _dump_json(settings) if settings else _EMPTY_JSON
             
+            # 创建和更新时间由服务端 NOW() 生成
             query = """
                 INSERT INTO conversations (title, created_at, updated_at, settings, description)
-                VALUES (%s, %s, %s, %s, %s)
+                VALUES (%s, NOW(), NOW(), %s, %s)
             """
-            params = (title, now, now, settings_json, description)
+            params = (title, settings_json, description)
             
             # 执行插入并获取最后插入的ID
-            conn = self.pool.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(query, params)
-            conversation_id = cursor.lastrowid
-            conn.commit()
-            
-            cursor.close()
-            conn.close()
+            with self._session() as (conn, cursor):
+                cursor.execute(query, params)
+                conversation_id = cursor.lastrowid
             
             logger.info(f"创建新对话成功: {conversation_id}")
             return conversation_id
@@ -252,8 +512,11 @@ class MySQLStore:
             bool: 操作是否成功
         """
         try:
+            # 先分块删除消息，删除对话时 ON DELETE CASCADE 只需处理剩余的少量消息
+            self._delete_messages_in_chunks(conversation_id)
             query = "DELETE FROM conversations WHERE id = %s"
-            self.execute_query(query, (conversation_id,))
+            self.execute_query(query, (conversation_id,), dictionary=False)
+            self._conversation_cache.invalidate(conversation_id)
             logger.info(f"删除对话成功: {conversation_id}")
             return True
             
@@ -271,12 +534,20 @@ class MySQLStore:
             Optional[Dict]: 对话信息
         """
         try:
-            query = "SELECT * FROM conversations WHERE id = %s"
+            cached = self._conversation_cache.get(conversation_id)
+            if cached is not None:
+                return cached
+            generation = self._conversation_cache.generation
+            
+            query = f"SELECT {_CONVERSATION_COLUMNS} FROM conversations WHERE id = %s"
             result = self.execute_query(query, (conversation_id,), fetch='one')
             
             if result and 'settings' in result and result['settings']:
-                result['settings'] = json.loads(result['settings'])
-                
+                result['settings'] = _parse_settings(result['settings'])
+            
+            if result:
+                result['files'] = _parse_files(result.get('files'))
+                self._conversation_cache.put(conversation_id, result, generation)
             return result
             
         except Exception as e:
@@ -290,21 +561,19 @@ class MySQLStore:
             List[Dict]: 对话列表
         """
         try:
-            query = """
-                SELECT c.*, COUNT(m.id) as message_count, 
-                       MAX(m.created_at) as last_activity
-                FROM conversations c
-                LEFT JOIN conversation_messages m ON c.id = m.conversation_id
-                GROUP BY c.id
-                ORDER BY c.updated_at DESC
+            # message_count、last_activity 由写入消息时维护，无需访问消息表
+            query = f"""
+                SELECT {_CONVERSATION_COLUMNS} FROM conversations
+                ORDER BY updated_at DESC
             """
             
             results = self.execute_query(query, fetch='all')
             
-            # 解析settings字段
+            # 解析settings和files字段
             for result in results:
                 if 'settings' in result and result['settings']:
-                    result['settings'] = json.loads(result['settings'])
+                    result['settings'] = _parse_settings(result['settings'])
+                result['files'] = _parse_files(result.get('files'))
             
             return results
             
@@ -339,30 +608,68 @@ class MySQLStore:
             
             if settings is not None:
                 update_fields.append("settings = %s")
-                params.append(json.dumps(settings))
+                params.append(_dump_json(settings))
             
             if not update_fields:
                 return True  # 没有需要更新的字段
                 
             # 添加更新时间
-            update_fields.append("updated_at = %s")
-            params.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            update_fields.append("updated_at = NOW()")
             
             # 添加条件参数
             params.append(conversation_id)
             
             # 执行更新
             sql = f"UPDATE conversations SET {', '.join(update_fields)} WHERE id = %s"
-            with self.pool.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(sql, params)
-                    conn.commit()
-                    return cursor.rowcount > 0
-                    
+            with self._session() as (conn, cursor):
+                cursor.execute(sql, params)
+                updated = cursor.rowcount > 0
+            self._conversation_cache.invalidate(conversation_id)
+            return updated
+        
         except Exception as e:
             logger.error(f"更新对话失败: {str(e)}")
             return False
     
+    def upsert_conversation(self, conversation_id: int, title: str, description: str = "", settings: Dict = None) -> bool:
+        """按指定ID创建对话，已存在时更新标题、描述和设置
+        
+        使用 INSERT ... ON DUPLICATE KEY UPDATE 在一条语句中完成，调用方无需先查询对话是否存在。
+        
+        Args:
+            conversation_id: 对话ID
+            title: 标题
+            description: 描述
+            settings: 设置
+        
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            settings_json = _dump_json(settings) if settings else _EMPTY_JSON
+            
+            query = """
+                INSERT INTO conversations (id, title, created_at, updated_at, settings, description)
+                VALUES (%s, %s, NOW(), NOW(), %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    title = VALUES(title),
+                    description = VALUES(description),
+                    settings = VALUES(settings),
+                    updated_at = VALUES(updated_at)
+            """
+            with self._session() as (conn, cursor):
+                cursor.execute(query, (conversation_id, title, settings_json, description))
+                # 影响行数：1 表示新建，2 表示更新，0 表示内容未变化
+                created = cursor.rowcount == 1
+            self._conversation_cache.invalidate(conversation_id)
+            
+            logger.info(f"{'创建' if created else '更新'}对话成功: {conversation_id}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"创建或更新对话失败: {str(e)}")
+            return False
+    
     def update_conversation_files(self, conversation_id: int, files: List[str]) -> bool:
         """更新对话关联的文件ID列表
         
@@ -375,17 +682,17 @@ class MySQLStore:
         """
         try:
             # 构建更新SQL
-            sql = "UPDATE conversations SET files = %s, updated_at = %s WHERE id = %s"
+            sql = "UPDATE conversations SET files = %s, updated_at = NOW() WHERE id = %s"
             
             # 将文件ID列表转换为JSON字符串
-            files_json = json.dumps(files)
+            files_json = _dump_json(files)
             
             # 执行更新
-            with self.pool.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(sql, (files_json, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), conversation_id))
-                    conn.commit()
-                    return cursor.rowcount > 0
+            with self._session() as (conn, cursor):
+                cursor.execute(sql, (files_json, conversation_id))
+                updated = cursor.rowcount > 0
+            self._conversation_cache.invalidate(conversation_id)
+            return updated
                     
         except Exception as e:
             logger.error(f"更新对话文件失败: {str(e)}")
@@ -410,70 +717,280 @@ class MySQLStore:
             bool: 操作是否成功
         """
         try:
-            # 首先检查对话是否存在
-            query_conv = "SELECT id FROM conversations WHERE id = %s"
-            conv_exists = self.execute_query(query_conv, (conversation_id,), fetch='one')
-            
-            if not conv_exists:
+            metadata_json = _dump_json(metadata) if metadata else _EMPTY_JSON
+            params = (conversation_id, timestamp, user_message, ai_response, tokens_input, tokens_output, cost,
+                      metadata_json)
+            
+            with self._session() as (conn, cursor):
+                # 存储过程会自行开启和提交事务，已在外层事务中时改为逐条执行语句，避免隐式提交外层事务
+                if self._save_message_procedure and not conn.in_transaction:
+                    # 插入、计数更新和提交在服务端完成，只需一次往返
+                    cursor.execute(f"CALL {_SAVE_MESSAGE_PROCEDURE}(%s, %s, %s, %s, %s, %s, %s, %s)", params)
+                    status = cursor.fetchone()[0]
+                    # CALL 在结果集之后还会返回一个状态结果，读完后连接才能执行下一条语句；
+                    # cursor.nextset() 需要 mysql-connector-python 9.2 及以上版本，见 requirements.txt
+                    while cursor.nextset():
+                        pass
+                else:
+                    status = self._insert_message(params)
+            
+            if status < 0:
                 logger.warning(f"保存消息失败，对话ID不存在: {conversation_id}")
                 return False
-                
-            # 检查是否存在相同时间戳的消息，避免重复保存
-            check_query = """
-                SELECT COUNT(*) as count FROM conversation_messages 
-                WHERE conversation_id = %s AND timestamp = %s
-            """
-            check_result = self.execute_query(check_query, (conversation_id, timestamp), fetch='one')
-            
-            if check_result and check_result.get('count', 0) > 0:
+            if status == 0:
                 logger.info(f"跳过保存已存在的对话消息: {conversation_id}, timestamp: {timestamp}")
                 return True
-                
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            metadata_json = json.dumps(metadata or {})
+            self._conversation_cache.invalidate(conversation_id)
             
-            # 使用原始连接和游标进行插入，以便更好地控制提交和获取错误
-            conn = self.pool.get_connection()
-            cursor = conn.cursor()
+            logger.info(f"保存对话消息成功: {conversation_id}, timestamp: {timestamp}")
+            return True
             
-            try:
-                query = """
+        except Exception as e:
+            logger.error(f"保存对话消息失败: {str(e)}")
+            return False
+            
+    def _insert_message(self, params: tuple) -> int:
+        """逐条执行语句保存单条消息，与存储过程 _SAVE_MESSAGE_PROCEDURE 的逻辑和返回状态相同
+        
+        Args:
+            params: 与存储过程参数顺序相同的参数
+            
+        Returns:
+            int: 1 已插入，0 消息已存在，-1 对话不存在
+        """
+        conversation_id = params[0]
+        with self._session(transaction=True) as (conn, cursor):
+            if not self._unique_timestamps:
+                # 唯一索引不可用时，插入前查询消息是否已存在
+                cursor.execute(
+                    "SELECT 1 FROM conversation_messages WHERE conversation_id = %s AND timestamp = %s LIMIT 1",
+                    (conversation_id, params[1])
+                )
+                if cursor.fetchone():
+                    return 0
+            
+            # 对话存在性并入 INSERT ... SELECT，时间戳去重由 uk_conv_ts 唯一索引完成，
+            # 对话不存在或消息已存在时不插入任何行。重复键只做空更新（影响行数为 0），
+            # 不用 INSERT IGNORE，数据截断、非法值等错误仍然会报错
+            cursor.execute("""
+                INSERT INTO conversation_messages 
+                (conversation_id, timestamp, user_message, ai_response, tokens_input, 
+                tokens_output, cost, created_at, metadata)
+                SELECT c.id, %s, %s, %s, %s, %s, %s, NOW(), %s
+                FROM conversations c
+                WHERE c.id = %s
+                ON DUPLICATE KEY UPDATE conversation_messages.id = conversation_messages.id
+            """, (*params[1:], conversation_id))
+            
+            if cursor.rowcount == 0:
+                # 未插入时才额外查询一次，区分对话不存在和重复消息；没有写入任何行，无需回滚，
+                # 在外层事务中调用时回滚会丢弃调用方之前的写入
+                cursor.execute("SELECT id FROM conversations WHERE id = %s", (conversation_id,))
+                return 0 if cursor.fetchone() else -1
+            
+            # 更新对话的最后活动时间和消息数，与插入在同一事务中提交
+            cursor.execute("""
+                UPDATE conversations
+                SET updated_at = NOW(), last_activity = NOW(), message_count = message_count + 1
+                WHERE id = %s
+            """, (conversation_id,))
+            return 1
+    
+    @staticmethod
+    def _existing_timestamps(cursor, conversation_id: int, messages: List[Dict[str, Any]]) -> set:
+        """查询一批消息中已存在于数据库的时间戳，uk_conv_ts 唯一索引不可用时用于写入前去重"""
+        timestamps = list(dict.fromkeys(message["timestamp"] for message in messages))
+        existing = set()
+        for start in range(0, len(timestamps), _INSERT_CHUNK_SIZE):
+            chunk = timestamps[start:start + _INSERT_CHUNK_SIZE]
+            cursor.execute(
+                f"SELECT timestamp FROM conversation_messages WHERE conversation_id = %s "
+                f"AND timestamp IN ({', '.join(['%s'] * len(chunk))})",
+                (conversation_id, *chunk)
+            )
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
+    
+    def save_messages(self, conversation_id: int, messages: List[Dict[str, Any]]) -> bool:
+        """批量保存对话消息
+        
+        所有消息在同一个连接和事务中写入：通过 _executemany_bulk 每 _INSERT_CHUNK_SIZE 条合并为一条多行 INSERT，
+        最后只更新一次对话的活动时间。已存在的时间戳和批次内重复的时间戳会被跳过。
+        
+        Args:
+            conversation_id: 对话ID
+            messages: 消息列表，每条包含 timestamp、user_message、ai_response，
+                      可选 tokens_input、tokens_output、cost、metadata
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        if not messages:
+            return True
+            
+        try:
+            with self._session(transaction=True) as (conn, cursor):
+                # 检查对话是否存在
+                cursor.execute("SELECT id FROM conversations WHERE id = %s", (conversation_id,))
+                if not cursor.fetchone():
+                    logger.warning(f"批量保存消息失败，对话ID不存在: {conversation_id}")
+                    return False
+                
+                # 批次内重复的时间戳只保留第一条，与数据库中已有消息的去重由 uk_conv_ts 唯一索引完成，
+                # 唯一索引不可用时先查出已存在的时间戳
+                rows = []
+                seen = set() if self._unique_timestamps else self._existing_timestamps(cursor, conversation_id, messages)
+                for message in messages:
+                    timestamp = message["timestamp"]
+                    if timestamp in seen:
+                        continue
+                    seen.add(timestamp)
+                    rows.append((
+                        conversation_id, timestamp, message["user_message"], message["ai_response"],
+                        message.get("tokens_input", 0), message.get("tokens_output", 0), message.get("cost", 0),
+                        _dump_json(message["metadata"]) if message.get("metadata") else _EMPTY_JSON
+                    ))
+                
+                # 重复键只做空更新，影响行数只计新插入的行；数据错误仍然会报错并回滚整批
+                inserted = self._executemany_bulk(cursor, """
                     INSERT INTO conversation_messages 
                     (conversation_id, timestamp, user_message, ai_response, tokens_input, 
                     tokens_output, cost, created_at, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                params = (conversation_id, timestamp, user_message, ai_response, 
-                         tokens_input, tokens_output, cost, now, metadata_json)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), %s)
+                    ON DUPLICATE KEY UPDATE id = id
+                """, rows)
                 
-                cursor.execute(query, params)
-                conn.commit()
+                if not inserted:
+                    logger.info(f"批量保存跳过 {len(messages)} 条已存在的对话消息: {conversation_id}")
+                    return True
                 
-                # 更新对话的最后活动时间
-                update_query = """
-                    UPDATE conversations 
-                    SET updated_at = %s 
+                # 整批写入后只更新一次对话的最后活动时间和消息数
+                cursor.execute("""
+                    UPDATE conversations
+                    SET updated_at = NOW(), last_activity = NOW(), message_count = message_count + %s
                     WHERE id = %s
-                """
-                cursor.execute(update_query, (now, conversation_id))
-                conn.commit()
-                
-                logger.info(f"保存对话消息成功: {conversation_id}, timestamp: {timestamp}")
-                return True
-            except Exception as e:
-                conn.rollback()
-                logger.error(f"保存对话消息SQL执行失败: {str(e)}")
+                """, (inserted, conversation_id))
+            self._conversation_cache.invalidate(conversation_id)
+            
+            logger.info(f"批量保存对话消息成功: {conversation_id}, 新增 {inserted} 条，跳过 {len(messages) - inserted} 条")
+            return True
+            
+        except Exception as e:
+            logger.error(f"批量保存对话消息失败: {str(e)}")
+            return False
+            
+    def bulk_import_messages(self, conversation_id: int, messages: List[Dict[str, Any]]) -> bool:
+        """通过 LOAD DATA LOCAL INFILE 批量导入对话消息
+        
+        用于导出导入、迁移等大批量场景：消息先写入临时 CSV 文件，再由服务端一次性装载，省去逐行的 SQL 解析。
+        LOAD DATA LOCAL 遇到重复键时跳过该行，已存在的时间戳由 uk_conv_ts 唯一索引跳过。
+        服务端未开启 local_infile 等导致装载失败，或唯一索引不可用时，回退到 save_messages。
+        
+        Args:
+            conversation_id: 对话ID
+            messages: 消息列表，格式同 save_messages
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        if not messages:
+            return True
+        if not self._unique_timestamps:
+            return self.save_messages(conversation_id, messages)
+            
+        conn = None
+        cursor = None
+        path = None
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", suffix=".csv", delete=False) as f:
+                path = f.name
+                _write_messages_csv(f, conversation_id, messages)
+            
+            # LOAD DATA LOCAL 需要单独开启 allow_local_infile 的连接，不使用连接池
+            conn = mysql.connector.connect(**self.db_config, allow_local_infile=True)
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id FROM conversations WHERE id = %s", (conversation_id,))
+            if not cursor.fetchone():
+                logger.warning(f"批量导入消息失败，对话ID不存在: {conversation_id}")
                 return False
-            finally:
+            
+            conn.start_transaction()
+            cursor.execute("""
+                LOAD DATA LOCAL INFILE %s INTO TABLE conversation_messages
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' ENCLOSED BY '"' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                (conversation_id, timestamp, user_message, ai_response, tokens_input,
+                tokens_output, cost, @meta)
+                SET created_at = NOW(), metadata = @meta
+            """, (path,))
+            imported = cursor.rowcount
+            
+            cursor.execute("""
+                UPDATE conversations
+                SET updated_at = NOW(), last_activity = NOW(), message_count = message_count + %s
+                WHERE id = %s
+            """, (imported, conversation_id))
+            conn.commit()
+            self._conversation_cache.invalidate(conversation_id)
+            
+            logger.info(f"批量导入对话消息成功: {conversation_id}, 共 {imported} 条")
+            return True
+            
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            logger.warning(f"LOAD DATA 导入对话消息失败，回退到批量 INSERT: {str(e)}")
+            # 先释放独立连接，再走连接池写入
+            if cursor:
                 cursor.close()
+                cursor = None
+            if conn:
                 conn.close()
-            
+                conn = None
+            return self.save_messages(conversation_id, messages)
         except Exception as e:
-            logger.error(f"保存对话消息失败: {str(e)}")
+            if conn:
+                conn.rollback()
+            logger.error(f"批量导入对话消息失败: {str(e)}")
             return False
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
             
-    def get_conversation_messages(self, conversation_id: int, limit: int = 50, offset: int = 0, sort_asc: bool = False) -> List[Dict]:
+    def export_conversation(self, conversation_id: int) -> Iterator[Dict[str, Any]]:
+        """按写入顺序逐条导出对话的全部消息
+        
+        使用流式查询，消息再多也不会一次性载入内存。产出的字典包含 timestamp、user_message、ai_response、
+        tokens_input、tokens_output、cost、metadata，可直接交给 save_messages 或 bulk_import_messages 导入。
+        
+        Args:
+            conversation_id: 对话ID
+            
+        Returns:
+            Iterator[Dict[str, Any]]: 消息迭代器
+        """
+        query = """
+            SELECT timestamp, user_message, ai_response, tokens_input, tokens_output, cost, metadata
+            FROM conversation_messages
+            WHERE conversation_id = %s
+            ORDER BY id
+        """
+        for row in self.execute_query(query, (conversation_id,), fetch='stream'):
+            if row['metadata']:
+                row['metadata'] = fastjson.loads(row['metadata'])
+            yield row
+    
+    def get_conversation_messages(self, conversation_id: int, limit: int = 50, offset: int = 0, sort_asc: bool = False,
+                                  parse_metadata: bool = False, before_id: Optional[int] = None) -> List[Dict]:
         """获取对话历史消息
         
         Args:
@@ -481,27 +998,45 @@ class MySQLStore:
             limit: 每页数量
             offset: 偏移量
             sort_asc: 是否按时间升序排序，True表示从旧到新，False表示从新到旧
+            parse_metadata: 是否返回并解析metadata字段，只用到消息内容的调用方无需读取
+            before_id: 游标分页，只返回ID小于该值的最新 limit 条消息（忽略 offset），
+                       翻页代价与页数无关；结果仍按 sort_asc 排列
             
         Returns:
             List[Dict]: 消息列表
         """
         try:
-            # 根据排序参数设置排序方向
-            sort_direction = "ASC" if sort_asc else "DESC"
-            
-            query = f"""
-                SELECT * FROM conversation_messages
-                WHERE conversation_id = %s
-                ORDER BY created_at {sort_direction}
-                LIMIT %s OFFSET %s
-            """
-            
-            results = self.execute_query(query, (conversation_id, limit, offset), fetch='all')
+            # 不需要解析metadata的调用方也不读取该列
+            columns = f"{_MESSAGE_COLUMNS}, metadata" if parse_metadata else _MESSAGE_COLUMNS
+            
+            if before_id is not None:
+                # 沿 idx_conv_id 索引定位后顺序读取，不需要像 OFFSET 那样读取并丢弃前面的行
+                query = f"""
+                    SELECT {columns} FROM conversation_messages
+                    WHERE conversation_id = %s AND id < %s
+                    ORDER BY id DESC
+                    LIMIT %s
+                """
+                results = self.execute_query(query, (conversation_id, before_id, limit), fetch='all')
+                if sort_asc:
+                    results.reverse()
+            else:
+                # 根据排序参数设置排序方向
+                sort_direction = "ASC" if sort_asc else "DESC"
+                
+                query = f"""
+                    SELECT {columns} FROM conversation_messages
+                    WHERE conversation_id = %s
+                    ORDER BY created_at {sort_direction}
+                    LIMIT %s OFFSET %s
+                """
+                results = self.execute_query(query, (conversation_id, limit, offset), fetch='all')
             
             # 解析metadata字段
-            for result in results:
-                if 'metadata' in result and result['metadata']:
-                    result['metadata'] = json.loads(result['metadata'])
+            if parse_metadata:
+                for result in results:
+                    if 'metadata' in result and result['metadata']:
+                        result['metadata'] = fastjson.loads(result['metadata'])
             
             return results
             
@@ -510,7 +1045,7 @@ class MySQLStore:
             return []
             
     def count_conversation_messages(self, conversation_id: int) -> int:
-        """统计对话消息数量
+        """统计对话消息数量，读取对话表中维护的 message_count，不扫描消息表
         
         Args:
             conversation_id: 对话ID
@@ -519,21 +1054,47 @@ class MySQLStore:
             int: 消息数量
         """
         try:
-            query = """
-                SELECT COUNT(*) as count FROM conversation_messages
-                WHERE conversation_id = %s
-            """
+            cached = self._conversation_cache.get(conversation_id)
+            if cached is not None:
+                return cached.get('message_count') or 0
             
-            result = self.execute_query(query, (conversation_id,), fetch='one')
-            return result.get('count', 0) if result else 0
+            query = "SELECT message_count FROM conversations WHERE id = %s"
+            
+            result = self.execute_query(query, (conversation_id,), fetch='one', dictionary=False)
+            return result[0] if result else 0
             
         except Exception as e:
             logger.error(f"统计对话消息失败: {str(e)}")
             return 0
             
+    def _delete_messages_in_chunks(self, conversation_id: int) -> int:
+        """按 _DELETE_CHUNK_SIZE 分块删除对话的消息
+        
+        连接为自动提交模式，每条 DELETE 单独提交并释放行锁，其他查询可以在块之间穿插执行。
+        按 id 排序删除，走 (conversation_id, id) 索引，基于语句的复制下结果也是确定的。
+        
+        Args:
+            conversation_id: 对话ID
+            
+        Returns:
+            int: 删除的消息数
+        """
+        deleted = 0
+        with self._session() as (conn, cursor):
+            while True:
+                cursor.execute("""
+                    DELETE FROM conversation_messages WHERE conversation_id = %s
+                    ORDER BY id LIMIT %s
+                """, (conversation_id, _DELETE_CHUNK_SIZE))
+                deleted += cursor.rowcount
+                if cursor.rowcount < _DELETE_CHUNK_SIZE:
+                    return deleted
+    
     def delete_conversation_messages(self, conversation_id: int) -> bool:
         """删除对话的所有消息
         
+        消息分块删除，最后在一个小事务中删除分块期间新写入的消息并清零计数。
+        
         Args:
             conversation_id: 对话ID
             
@@ -541,8 +1102,15 @@ class MySQLStore:
             bool: 操作是否成功
         """
         try:
-            query = "DELETE FROM conversation_messages WHERE conversation_id = %s"
-            self.execute_query(query, (conversation_id,))
+            self._delete_messages_in_chunks(conversation_id)
+            with self._session(transaction=True) as (conn, cursor):
+                cursor.execute("DELETE FROM conversation_messages WHERE conversation_id = %s", (conversation_id,))
+                # 同一事务中清零对话的消息计数
+                cursor.execute("""
+                    UPDATE conversations SET message_count = 0, last_activity = NULL WHERE id = %s
+                """, (conversation_id,))
+            self._conversation_cache.invalidate(conversation_id)
+            
             logger.info(f"删除对话消息成功: {conversation_id}")
             return True
             
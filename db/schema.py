@@ -0,0 +1,226 @@
+"""
+数据库表结构和迁移
+mysql_store 启动时和 utils/db_init 初始化工具共用这里的建表语句和旧表迁移逻辑
+"""
+import logging
+
+from utils.logger import logger
+from core.config import settings
+
+# 建表之后补充的二级索引：(表名, 索引名, 列)，已有的旧表在初始化时按需补建
+SECONDARY_INDEXES = [
+    # 对话列表按最后更新时间排序
+    ("conversations", "idx_conv_updated", "updated_at"),
+    # 对话消息按创建时间分页，避免 filesort
+    ("conversation_messages", "idx_conv_created", "conversation_id, created_at"),
+    # 基于消息ID的游标分页
+    ("conversation_messages", "idx_conv_id", "conversation_id, id"),
+]
+
+# 对话表
+CONVERSATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        settings JSON,
+        description TEXT,
+        message_count INT NOT NULL DEFAULT 0,
+        last_activity DATETIME NULL,
+        files JSON NULL,
+        INDEX idx_conv_updated (updated_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# 对话消息表
+CONVERSATION_MESSAGES_DDL = """
+    CREATE TABLE IF NOT EXISTS conversation_messages (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        conversation_id INT NOT NULL,
+        timestamp VARCHAR(50) NOT NULL,
+        user_message TEXT NOT NULL,
+        ai_response TEXT NOT NULL,
+        tokens_input INT,
+        tokens_output INT,
+        cost FLOAT,
+        created_at DATETIME NOT NULL,
+        metadata JSON,
+        UNIQUE KEY uk_conv_ts (conversation_id, timestamp),
+        INDEX idx_conv_created (conversation_id, created_at),
+        INDEX idx_conv_id (conversation_id, id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+def quote_identifier(name: str) -> str:
+    """用反引号引用数据库名等标识符，标识符不能作为查询参数传入"""
+    return "`" + name.replace("`", "``") + "`"
+
+def _decode(value):
+    """information_schema 的字符串列在部分驱动配置下以 bytes 返回"""
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+def create_database(cursor, db_name: str) -> bool:
+    """创建数据库（已存在时不做改动），返回是否为新建"""
+    # 一条 CREATE DATABASE IF NOT EXISTS 完成检查和创建，影响行数为 1 表示新建
+    cursor.execute(
+        f"CREATE DATABASE IF NOT EXISTS {quote_identifier(db_name)} "
+        "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+    )
+    return cursor.rowcount > 0
+
+def ensure_foreign_key(cursor, log: logging.Logger = logger) -> None:
+    """为对话消息表添加指向对话表的级联删除外键"""
+    try:
+        # 检查是否已存在约束
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM information_schema.TABLE_CONSTRAINTS 
+            WHERE CONSTRAINT_SCHEMA = %s 
+            AND CONSTRAINT_NAME = 'fk_conversation_id'
+        """, (settings.MYSQL_DATABASE,))
+        
+        if cursor.fetchone()[0] > 0:
+            log.info("外键约束已存在，跳过添加")
+            return
+        
+        cursor.execute("""
+            ALTER TABLE conversation_messages
+            ADD CONSTRAINT fk_conversation_id
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) 
+            ON DELETE CASCADE
+        """)
+        log.info("对话消息表外键约束添加成功")
+    except Exception as e:
+        log.warning(f"添加外键约束失败 (这可能是正常的，如果约束已存在): {str(e)}")
+
+def ensure_conversation_counters(cursor, log: logging.Logger = logger) -> None:
+    """为旧版本创建的对话表补充 message_count、last_activity 列，并按现有消息回填
+    
+    这两列在写入和删除消息的同一事务中维护，对话列表无需再聚合消息表。
+    """
+    try:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'conversations' AND COLUMN_NAME = 'message_count'
+        """, (settings.MYSQL_DATABASE,))
+        
+        if cursor.fetchone()[0] > 0:
+            return
+        
+        cursor.execute("""
+            ALTER TABLE conversations
+            ADD COLUMN message_count INT NOT NULL DEFAULT 0,
+            ADD COLUMN last_activity DATETIME NULL
+        """)
+        cursor.execute("""
+            UPDATE conversations c
+            JOIN (
+                SELECT conversation_id, COUNT(*) AS message_count, MAX(created_at) AS last_activity
+                FROM conversation_messages
+                GROUP BY conversation_id
+            ) m ON m.conversation_id = c.id
+            SET c.message_count = m.message_count, c.last_activity = m.last_activity
+        """)
+        log.info("对话表消息计数列添加并回填成功")
+    except Exception as e:
+        log.warning(f"添加对话消息计数列失败: {str(e)}")
+
+def ensure_conversation_files(cursor, log: logging.Logger = logger) -> None:
+    """为旧版本创建的对话表补充 files 列，保存对话关联的知识库文件ID列表"""
+    try:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'conversations' AND COLUMN_NAME = 'files'
+        """, (settings.MYSQL_DATABASE,))
+        
+        if cursor.fetchone()[0] > 0:
+            return
+        
+        cursor.execute("ALTER TABLE conversations ADD COLUMN files JSON NULL")
+        log.info("对话表 files 列添加成功")
+    except Exception as e:
+        log.warning(f"添加对话表 files 列失败: {str(e)}")
+
+def ensure_unique_timestamps(cursor, log: logging.Logger = logger) -> bool:
+    """为旧版本创建的消息表添加 (conversation_id, timestamp) 唯一索引，返回唯一索引是否可用
+    
+    消息去重由唯一索引在写入时保证，唯一索引取代了旧版本同列上未命名的普通索引（索引名为 conversation_id）。
+    表中已有重复消息时无法添加，需要先清理重复数据；在此之前写入方需要在插入前自行查询去重。
+    """
+    try:
+        cursor.execute("""
+            SELECT INDEX_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'conversation_messages'
+            AND INDEX_NAME IN ('uk_conv_ts', 'conversation_id')
+        """, (settings.MYSQL_DATABASE,))
+        
+        index_names = {_decode(name) for (name,) in cursor.fetchall()}
+        if "uk_conv_ts" in index_names:
+            return True
+        
+        alter = "ALTER TABLE conversation_messages ADD UNIQUE KEY uk_conv_ts (conversation_id, timestamp)"
+        if "conversation_id" in index_names:
+            alter += ", DROP INDEX conversation_id"
+        cursor.execute(alter)
+        log.info("对话消息表唯一索引 uk_conv_ts 添加成功")
+        return True
+    except Exception as e:
+        log.error(f"添加对话消息表唯一索引 uk_conv_ts 失败 (表中可能已有重复消息)，"
+                  f"清理重复消息前保存消息将在插入前逐条查询去重: {str(e)}")
+        return False
+
+def ensure_indexes(cursor, log: logging.Logger = logger) -> None:
+    """为旧版本创建的表补建 SECONDARY_INDEXES 中缺少的索引"""
+    for table, index_name, columns in SECONDARY_INDEXES:
+        try:
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s
+            """, (settings.MYSQL_DATABASE, table, index_name))
+            
+            if cursor.fetchone()[0] > 0:
+                continue
+            
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})")
+            log.info(f"索引 {table}.{index_name} 添加成功")
+        except Exception as e:
+            log.warning(f"添加索引 {table}.{index_name} 失败: {str(e)}")
+
+def ensure_message_compression(cursor, log: logging.Logger = logger) -> None:
+    """开启 MYSQL_COMPRESS_MESSAGES 时将对话消息表转换为 InnoDB 压缩行格式"""
+    if not settings.MYSQL_COMPRESS_MESSAGES:
+        return
+    try:
+        cursor.execute("""
+            SELECT ROW_FORMAT
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'conversation_messages'
+        """, (settings.MYSQL_DATABASE,))
+        
+        row = cursor.fetchone()
+        row_format = _decode(row[0]) if row else None
+        if not row_format or row_format.lower() == "compressed":
+            return
+        
+        cursor.execute("ALTER TABLE conversation_messages ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8")
+        log.info("对话消息表已转换为压缩行格式")
+    except Exception as e:
+        log.warning(f"转换对话消息表为压缩行格式失败: {str(e)}")
+
+def migrate(cursor, log: logging.Logger = logger) -> bool:
+    """对旧版本创建的表执行全部迁移，每一步都是幂等的，失败只记录日志不中断
+    
+    Returns:
+        bool: uk_conv_ts 唯一索引是否可用，不可用时写入方不能依赖唯一索引去重
+    """
+    ensure_conversation_counters(cursor, log)
+    ensure_conversation_files(cursor, log)
+    unique_timestamps = ensure_unique_timestamps(cursor, log)
+    ensure_indexes(cursor, log)
+    ensure_message_compression(cursor, log)
+    return unique_timestamps
@@ -10,7 +10,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import time
 import uvicorn
-from core.config import settings
+from core.config import settings, ensure_dirs
 from api.router import api_router
 from utils.logger import logger, get_logger
 
@@ -99,11 +99,13 @@ async def root():
 # 直接运行时的入口
 def start():
     # 确保必要的目录存在
-    os.makedirs(settings.LOGS_DIR, exist_ok=True)
-    os.makedirs(settings.BACKUPS_DIR, exist_ok=True)
-    os.makedirs(os.path.dirname(settings.FAISS_INDEX_PATH), exist_ok=True)
-    os.makedirs(settings.KNOWLEDGE_DIR, exist_ok=True)
-    os.makedirs(os.path.dirname(settings.KNOWLEDGE_INDEX_PATH), exist_ok=True)
+    ensure_dirs(
+        settings.LOGS_DIR,
+        settings.BACKUPS_DIR,
+        os.path.dirname(settings.FAISS_INDEX_PATH),
+        settings.KNOWLEDGE_DIR,
+        os.path.dirname(settings.KNOWLEDGE_INDEX_PATH),
+    )
     
     # 检查是否需要初始化数据库
     # 如果是直接运行main.py，则需要初始化数据库
@@ -1,4 +1,5 @@
 from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 from datetime import datetime
 import os
 from openai import OpenAI, AsyncOpenAI
@@ -74,9 +75,10 @@ class ChatService:
                 logger.info(f"使用增强记忆检索，对话ID: {conversation_id or '默认'}")
                 start_memory_time = time.time()
                 
-                # 使用增强版记忆检索
+                # 使用增强版记忆检索，向量化、FAISS 检索和 MySQL 查询都是阻塞调用，放到线程池中执行
                 try:
-                    context, memories_used = MemoryService.get_enhanced_context(
+                    context, memories_used = await asyncio.to_thread(
+                        MemoryService.get_enhanced_context,
                         query=message, 
                         max_memories=5,  # 可以根据需要调整
                         conversation_id=conversation_id
@@ -105,7 +107,8 @@ class ChatService:
                 except Exception as e:
                     logger.error(f"增强记忆检索失败: {str(e)}", exc_info=True)
                     # 失败时回退到原始方法
-                    context, memories_used = MemoryService.get_context(
+                    context, memories_used = await asyncio.to_thread(
+                        MemoryService.get_context,
                         message, 
                         conversation_id=conversation_id
                     )
@@ -127,7 +130,7 @@ class ChatService:
                     else:
                         # 尝试从conversationService获取关联的文件
                         from services.conversation_service import conversation_service
-                        conversation = conversation_service.get_conversation(conversation_id)
+                        conversation = await asyncio.to_thread(conversation_service.get_conversation, conversation_id)
                         if conversation and "files" in conversation:
                             file_ids = conversation.get("files", [])
                             if file_ids:
@@ -231,8 +234,9 @@ class ChatService:
             if use_web_search and web_search_results:
                 web_search_content = "\n4.以下是与用户问题相关的网络搜索结果，你可以参考这些内容来回答用户的问题：\n"
                 for i, result in enumerate(web_search_results):
-                    title = result.get("metadata", {}).get("title", "")
-                    link = result.get("metadata", {}).get("link", "")
+                    result_meta = result.get("metadata") or {}
+                    title = result_meta.get("title", "")
+                    link = result_meta.get("link", "")
                     content = result.get("content", "")
                     web_search_content += f"[{i+1}] 标题: {title}\n链接: {link}\n内容: {content}\n\n"
             
@@ -324,13 +328,13 @@ class ChatService:
                 from services.conversation_service import conversation_service
                 from db.mysql_store import mysql_db
                 
-                # 首先检查对话是否存在
-                conversation = mysql_db.get_conversation(conversation_id)
+                # 首先检查对话是否存在，MySQL 调用是阻塞的，放到线程池中执行避免阻塞事件循环
+                conversation = await asyncio.to_thread(mysql_db.get_conversation, conversation_id)
                 if not conversation:
                     logger.warning(f"要保存消息的对话ID不存在: {conversation_id}，尝试创建新对话")
                     # 创建新对话
                     title = f"对话 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                    new_id = mysql_db.create_conversation(title=title)
+                    new_id = await asyncio.to_thread(mysql_db.create_conversation, title=title)
                     if new_id:
                         conversation_id = new_id
                         logger.info(f"已创建新对话: ID={new_id}, 标题={title}")
@@ -350,7 +354,8 @@ class ChatService:
                     
                     logger.info(f"保存对话消息: ID={conversation_id}, 时间戳={timestamp}")
                     
-                    save_result = conversation_service.save_message(
+                    save_result = await asyncio.to_thread(
+                        conversation_service.save_message,
                         conversation_id=conversation_id,
                         timestamp=timestamp,
                         user_message=message,
@@ -368,7 +373,8 @@ class ChatService:
                     
                     # 保存关联文件（如果有新的）
                     if conversation_files:
-                        files_result = conversation_service.update_conversation_files(
+                        files_result = await asyncio.to_thread(
+                            conversation_service.update_conversation_files,
                             conversation_id=conversation_id,
                             file_ids=conversation_files
                         )
@@ -216,13 +216,7 @@ class ConversationService:
             bool: 操作是否成功
         """
         try:
-            # 检查对话是否存在
-            conversation = mysql_db.get_conversation(conversation_id)
-            if not conversation:
-                logger.warning(f"保存消息失败，对话不存在: {conversation_id}")
-                return False
-            
-            # 保存消息到MySQL
+            # 保存消息到MySQL，对话不存在时返回 False
             success = mysql_db.save_message(
                 conversation_id=conversation_id,
                 timestamp=timestamp,
@@ -249,7 +243,8 @@ class ConversationService:
     def get_conversation_messages(conversation_id: int, 
                                  page: int = 1, 
                                  page_size: int = 20,
-                                 sort_asc: bool = False) -> Dict[str, Any]:
+                                 sort_asc: bool = False,
+                                 before_id: Optional[int] = None) -> Dict[str, Any]:
         """获取对话消息历史
         
         Args:
@@ -257,6 +252,7 @@ class ConversationService:
             page: 页码，从1开始
             page_size: 每页数量
             sort_asc: 是否按时间升序排序
+            before_id: 游标分页，只返回ID小于该值的消息，指定时忽略 page
             
         Returns:
             Dict: 包含分页信息的消息列表
@@ -275,19 +271,21 @@ class ConversationService:
                     "conversation_id": conversation_id
                 }
             
-            # 计算偏移量
-            offset = (page - 1) * page_size
+            # 计算偏移量，游标分页时不需要偏移
+            offset = (page - 1) * page_size if before_id is None else 0
             
             # 获取消息列表
             messages = mysql_db.get_conversation_messages(
                 conversation_id=conversation_id, 
                 limit=page_size, 
                 offset=offset,
-                sort_asc=sort_asc
+                sort_asc=sort_asc,
+                parse_metadata=True,
+                before_id=before_id
             )
             
-            # 获取消息总数
-            total = mysql_db.count_conversation_messages(conversation_id)
+            # 消息总数直接取自上面查到的对话记录，不再单独查询
+            total = conversation.get("message_count") or 0
             
             # 计算总页数
             total_pages = (total + page_size - 1) // page_size if total > 0 else 0
@@ -584,9 +584,10 @@ class MemoryService:
             backup_path = os.path.join(backup_dir, f"memory_backup_{timestamp}")
             os.makedirs(backup_path, exist_ok=True)
             
-            # 备份FAISS索引
-            faiss_backup_path = os.path.join(backup_path, "faiss_index.pkl")
-            shutil.copy2(settings.FAISS_INDEX_PATH, faiss_backup_path)
+            # 备份FAISS索引及记忆文本，先保存尚未落盘的写入
+            memory_store.flush()
+            shutil.copy2(memory_store.faiss_path, os.path.join(backup_path, "faiss_index.faiss"))
+            shutil.copy2(memory_store.texts_path, os.path.join(backup_path, "faiss_index.jsonl"))
             
             # 从Neo4j导出所有记忆
             with neo4j_db.driver.session() as session:
@@ -641,19 +642,26 @@ class MemoryService:
                 logger.error(f"备份路径不存在: {backup_path}")
                 return False
             
-            # 检查备份文件是否存在
-            faiss_backup_path = os.path.join(backup_path, "faiss_index.pkl")
+            # 检查备份文件是否存在，兼容旧版的 pickle 备份
+            faiss_backup_path = os.path.join(backup_path, "faiss_index.faiss")
+            texts_backup_path = os.path.join(backup_path, "faiss_index.jsonl")
+            legacy_backup_path = os.path.join(backup_path, "faiss_index.pkl")
             neo4j_backup_path = os.path.join(backup_path, "neo4j_data.json")
             
-            if not os.path.exists(faiss_backup_path) or not os.path.exists(neo4j_backup_path):
+            has_faiss_backup = os.path.exists(faiss_backup_path) and os.path.exists(texts_backup_path)
+            if not (has_faiss_backup or os.path.exists(legacy_backup_path)) or not os.path.exists(neo4j_backup_path):
                 logger.error(f"备份文件不完整: {backup_path}")
                 return False
             
             # 清除现有数据
             MemoryService.clear_all_memories()
             
-            # 恢复FAISS索引
-            shutil.copy2(faiss_backup_path, settings.FAISS_INDEX_PATH)
+            # 恢复FAISS索引，旧版备份在重新加载时会被转换为新格式
+            if has_faiss_backup:
+                shutil.copy2(faiss_backup_path, memory_store.faiss_path)
+                shutil.copy2(texts_backup_path, memory_store.texts_path)
+            else:
+                shutil.copy2(legacy_backup_path, memory_store.index_path)
             
             # 重新加载FAISS索引
             memory_store.reload_index()
@@ -0,0 +1,58 @@
+import dataclasses
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入 core.memory_store / utils.logger 时会创建全局索引和日志文件，
+# 必须在导入任何项目模块之前把数据和日志目录指向临时目录，避免写入仓库
+_TMP_ROOT = tempfile.mkdtemp(prefix="neko-tests-")
+os.environ["NEKO_FAISS_INDEX_PATH"] = os.path.join(_TMP_ROOT, "data", "faiss_index.pkl")
+os.environ["NEKO_LOGS_DIR"] = os.path.join(_TMP_ROOT, "logs")
+os.environ["NEKO_BACKUPS_DIR"] = os.path.join(_TMP_ROOT, "backups")
+os.environ["NEKO_KNOWLEDGE_DIR"] = os.path.join(_TMP_ROOT, "knowledge", "data")
+os.environ["NEKO_KNOWLEDGE_INDEX_PATH"] = os.path.join(_TMP_ROOT, "knowledge", "index", "knowledge_index.pkl")
+
+from core import config as config_module
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TMP_ROOT, ignore_errors=True)
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """用修改了部分字段的新快照替换各模块中的 settings，测试结束后恢复
+
+    只读快照本身不被修改；通过 ``from core.config import settings`` 导入的模块各自持有引用，
+    因此替换所有指向当前快照的模块属性。
+    """
+    def override(**values):
+        current = config_module.settings
+        replaced = dataclasses.replace(current, **values)
+        for module in list(sys.modules.values()):
+            if module is not None and vars(module).get("settings") is current:
+                monkeypatch.setattr(module, "settings", replaced)
+
+    return override
+
+
+@pytest.fixture(scope="session")
+def mysql_store():
+    """导入 db.mysql_store 模块
+
+    模块导入时会创建全局 MySQLStore 实例并连接数据库，这里把连接和连接池替换为 MagicMock，
+    只用于测试不依赖数据库的部分。
+    """
+    connection = mock.MagicMock()
+    connection.cursor.return_value.rowcount = 0
+    with mock.patch("mysql.connector.connect", return_value=connection), \
+            mock.patch("mysql.connector.pooling.MySQLConnectionPool"):
+        from db import mysql_store
+    return mysql_store
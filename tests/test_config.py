@@ -0,0 +1,79 @@
+import dataclasses
+import datetime
+import json
+
+import pydantic
+import pytest
+
+from core.config import FrozenSettings, Settings, _FIELD_MAP, _FIELD_ORDER, _flatten_config, _read_yaml_cached
+
+
+def test_flatten_uses_defaults_for_missing_config():
+    values = _flatten_config({})
+    assert values == tuple(default for _, _, default in _FIELD_MAP)
+
+
+def test_flatten_reads_nested_paths():
+    attr, path, _ = next(field for field in _FIELD_MAP if len(field[1]) == 3)
+    config = {}
+    section = config
+    for part in path[:-1]:
+        section = section.setdefault(part, {})
+    section[path[-1]] = "configured"
+
+    values = dict(zip(_FIELD_ORDER, _flatten_config(config)))
+    assert values[attr] == "configured"
+
+
+def test_flatten_ignores_sections_that_are_not_dicts():
+    top_level = {path[0] for _, path, _ in _FIELD_MAP if len(path) > 1}
+    values = _flatten_config({name: "not a section" for name in top_level})
+    assert values == tuple(default for _, _, default in _FIELD_MAP)
+
+
+def test_from_config_resolves_every_field_and_freezes():
+    settings = Settings.from_config({"storage": {"mysql": {"database": "neko_test"}}})
+    assert settings.MYSQL_DATABASE == "neko_test"
+    assert settings.API_TIMEOUT == 30
+
+    frozen = settings.freeze()
+    assert isinstance(frozen, FrozenSettings)
+    assert [field.name for field in dataclasses.fields(FrozenSettings)] == list(_FIELD_ORDER)
+    assert frozen.MYSQL_DATABASE == "neko_test"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        frozen.MYSQL_DATABASE = "other"
+
+
+def test_yaml_cache_is_json_and_skips_values_json_cannot_hold(tmp_path):
+    source = tmp_path / "config.yaml"
+    cache = tmp_path / "config.yaml.cache"
+
+    source.write_text("storage:\n  mysql:\n    database: neko\n", encoding="utf-8")
+    assert _read_yaml_cached(source, cache) == {"storage": {"mysql": {"database": "neko"}}}
+    assert json.loads(cache.read_text(encoding="utf-8"))["data"] == {"storage": {"mysql": {"database": "neko"}}}
+    assert _read_yaml_cached(source, cache) == {"storage": {"mysql": {"database": "neko"}}}
+
+    # 日期和非字符串键经过 JSON 会改变类型，这类配置不写缓存
+    cache.unlink()
+    source.write_text("user:\n  created_at: 2023-01-01\n", encoding="utf-8")
+    assert _read_yaml_cached(source, cache) == {"user": {"created_at": datetime.date(2023, 1, 1)}}
+    assert not cache.exists()
+
+
+def test_unreadable_yaml_cache_is_ignored(tmp_path):
+    source = tmp_path / "config.yaml"
+    cache = tmp_path / "config.yaml.cache"
+    source.write_text("api:\n  key: abc\n", encoding="utf-8")
+    cache.write_bytes(b"\x80\x04not json")
+    assert _read_yaml_cached(source, cache) == {"api": {"key": "abc"}}
+
+
+def test_environment_overrides_config_file_and_is_validated(monkeypatch):
+    monkeypatch.setenv("NEKO_MYSQL_DATABASE", "from_env")
+    settings = Settings.from_config({"storage": {"mysql": {"database": "from_file"}}})
+    assert settings.MYSQL_DATABASE == "from_env"
+    assert settings.freeze().MYSQL_DATABASE == "from_env"
+
+    monkeypatch.setenv("NEKO_API_TIMEOUT", "not a number")
+    with pytest.raises(pydantic.ValidationError):
+        Settings.from_config({})
@@ -0,0 +1,40 @@
+import numpy as np
+
+from core.embedding import _EmbeddingCache
+
+
+def test_get_returns_writable_float32_copy():
+    cache = _EmbeddingCache(4)
+    cache.put("text", np.array([0.5, 1.0, -2.0], dtype=np.float32))
+
+    vector = cache.get("text")
+    assert vector.dtype == np.float32
+    np.testing.assert_array_equal(vector, [0.5, 1.0, -2.0])
+
+    vector[0] = 9.0
+    assert cache.get("text")[0] == 0.5
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _EmbeddingCache(2)
+    cache.put("a", np.zeros(2))
+    cache.put("b", np.ones(2))
+    cache.get("a")
+    cache.put("c", np.ones(2))
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_zero_size_disables_cache():
+    cache = _EmbeddingCache(0)
+    cache.put("text", np.ones(2))
+    assert cache.get("text") is None
+
+
+def test_key_includes_model(override_settings):
+    cache = _EmbeddingCache(4)
+    cache.put("text", np.ones(2))
+    override_settings(EMBEDDING_MODEL="another-model")
+    assert cache.get("text") is None
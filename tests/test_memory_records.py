@@ -0,0 +1,63 @@
+import numpy as np
+
+from core.memory_records import MemoryRecords
+
+
+def _records():
+    records = MemoryRecords()
+    records.append("2024-01-01 00:00:00.000000", 1, user_message="u0", ai_response="a0")
+    records.append("2024-01-02 00:00:00.000000", None, user_message="u1", ai_response="a1")
+    records.append("not a timestamp", 2, text="旧格式文本")
+    records.append("2024-01-03 00:00:00.000000", 1, user_message="u3", ai_response="a3")
+    return records
+
+
+def test_append_encodes_conversations_and_times():
+    records = _records()
+    assert len(records) == 4
+    assert records.conv_codes.tolist() == [0, -1, 1, 0]
+    assert records.code_of(None) == -1
+    assert records.code_of(3) is None
+    assert [records.conversation_id(i) for i in range(4)] == [1, None, 2, 1]
+    assert np.isnat(records.times[2])
+    assert records.times[0] == np.datetime64("2024-01-01T00:00:00", "us")
+
+
+def test_raw_texts_are_kept_apart():
+    records = _records()
+    assert records.parsed_indices().tolist() == [0, 1, 3]
+    assert not records.is_parsed(2)
+    assert records.to_dict(2) == {"text": "旧格式文本", "timestamp": "not a timestamp", "conversation_id": 2}
+
+    records.set_message(2, "u2", "a2")
+    assert records.is_parsed(2)
+    assert records.raw_texts == {}
+    assert records.to_dict(2)["user_message"] == "u2"
+
+
+def test_append_grows_past_initial_capacity():
+    records = MemoryRecords()
+    for i in range(200):
+        records.append(f"2024-01-01 00:00:{i % 60:02d}.{i:06d}", i % 5, user_message=f"u{i}", ai_response=f"a{i}")
+    assert len(records.conv_codes) == len(records.times) == 200
+    assert records.conversation_counts() == {i: 40 for i in range(5)}
+
+
+def test_take_keeps_codes_and_remaps_raw_texts():
+    records = _records()
+    taken = records.take(np.array([False, True, True, True]))
+    assert len(taken) == 3
+    assert taken.raw_texts == {1: "旧格式文本"}
+    assert [taken.conversation_id(i) for i in range(3)] == [None, 2, 1]
+    assert taken.code_of(1) == records.code_of(1)
+
+    # 筛选后的记录可以继续追加
+    taken.append("2024-01-04 00:00:00.000000", 5, user_message="u4", ai_response="a4")
+    assert taken.conversation_id(3) == 5
+    assert taken.conversation_counts() == {None: 1, 1: 1, 2: 1, 5: 1}
+
+
+def test_from_dicts_round_trips_to_dict():
+    records = _records()
+    rebuilt = MemoryRecords.from_dicts(records.to_dict(i) for i in range(len(records)))
+    assert [rebuilt.to_dict(i) for i in range(len(rebuilt))] == [records.to_dict(i) for i in range(len(records))]
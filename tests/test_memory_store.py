@@ -0,0 +1,148 @@
+import logging
+
+import faiss
+import numpy as np
+import pytest
+
+from core.memory_store import FAISSMemoryStore
+
+_DIMENSION = 16
+# IVF/IVFPQ 需要积累 _train_threshold() 条向量才会从预热的 Flat 索引训练为真正的索引
+_TOTAL = 10000
+_CONVERSATION_SIZE = 12
+_K = 5
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logger = logging.getLogger("neko")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    yield
+    logger.setLevel(level)
+
+
+@pytest.fixture
+def small_faiss(override_settings):
+    # 较小的聚类数和较低的搜索参数，让近似搜索在全部向量上过滤时很容易漏掉小对话的记忆
+    override_settings(FAISS_NLIST=16, FAISS_NPROBE=1, FAISS_PQ_M=4, FAISS_HNSW_EF_SEARCH=8,
+                      FAISS_MMAP=False, FAISS_QUERY_CACHE_SIZE=0, FAISS_METRIC="ip")
+
+
+@pytest.fixture
+def make_store(tmp_path, small_faiss):
+    stores = []
+
+    def make(index_type):
+        store = FAISSMemoryStore(dimension=_DIMENSION, index_type=index_type, index_path=str(tmp_path / "memory.index"))
+        stores.append(store)
+        return store
+
+    yield make
+    # 在测试内保存，避免退出时由 atexit 保存
+    for store in stores:
+        store.flush()
+
+
+def _timestamp(i):
+    return f"2024-01-01 00:00:00.{i:06d}"
+
+
+@pytest.mark.parametrize("index_type, expected_class, min_recall", [
+    ("flat", faiss.IndexFlat, 1.0),
+    ("hnsw", faiss.IndexHNSWFlat, 1.0),
+    ("ivf", faiss.IndexIVFFlat, 1.0),
+    ("ivfpq", faiss.IndexIVFPQ, 0.6),
+    ("sq8", faiss.IndexScalarQuantizer, 0.9),
+])
+def test_conversation_search_recall(make_store, index_type, expected_class, min_recall):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((_TOTAL, _DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    members = rng.choice(_TOTAL, _CONVERSATION_SIZE, replace=False)
+    conversation_ids = [None] * _TOTAL
+    for i in members.tolist():
+        conversation_ids[i] = 42
+
+    store = make_store(index_type)
+    assert store.add_texts_batch([f"用户: u{i}\n助手: a{i}" for i in range(_TOTAL)], vectors,
+                                 [_timestamp(i) for i in range(_TOTAL)], conversation_ids)
+    assert isinstance(store.index, expected_class)
+
+    queries = rng.standard_normal((20, _DIMENSION)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    results = store.search_batch(queries, k=_K, conversation_id=42)
+
+    hits = 0
+    for query, memories in zip(queries, results):
+        # 每个查询都应返回该对话中的 k 条记忆
+        assert len(memories) == _K
+        assert all(memory.conversation_id == 42 for memory in memories)
+        exact = members[np.argsort(-(vectors[members] @ query))[:_K]]
+        hits += len({_timestamp(i) for i in exact.tolist()} & {memory.timestamp for memory in memories})
+    assert hits / (len(queries) * _K) >= min_recall
+
+
+def test_paged_memories_keep_unparseable_timestamps_last(make_store):
+    store = make_store("flat")
+    timestamps = [
+        "2024-01-02 00:00:00.000000",
+        "bad timestamp",
+        "2024-01-01 00:00:00.000000",
+        "2024-01-02 00:00:00.000000",
+        "2024-01-03 00:00:00.000000",
+    ]
+    for i, timestamp in enumerate(timestamps):
+        store.add_text(f"用户: u{i}\n助手: a{i}", np.ones(_DIMENSION, dtype=np.float32), timestamp, conversation_id=1)
+
+    def page(sort_desc, **kwargs):
+        items = store.get_paged_memories(page_size=10, sort_desc=sort_desc, **kwargs)["items"]
+        return [item["user_message"] for item in items]
+
+    # 时间戳相同的记录在两个方向上都保持写入顺序
+    assert page(True) == ["u4", "u0", "u3", "u2", "u1"]
+    assert page(False) == ["u2", "u0", "u3", "u4", "u1"]
+    assert page(True, conversation_id=1) == ["u4", "u0", "u3", "u2", "u1"]
+
+    store.add_text("用户: u5\n助手: a5", np.ones(_DIMENSION, dtype=np.float32), "2024-01-04 00:00:00.000000",
+                   conversation_id=1)
+    assert page(True)[0] == "u5"
+
+
+def _save_five(store):
+    vectors = np.eye(_DIMENSION, dtype=np.float32)
+    store.add_texts_batch([f"用户: u{i}\n助手: a{i}" for i in range(5)], vectors[:5], [_timestamp(i) for i in range(5)])
+    store.flush()
+    return vectors
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_load_truncates_to_shared_prefix(make_store, index_type):
+    store = make_store(index_type)
+    vectors = _save_five(store)
+    # 模拟保存索引之后、追加记忆文本之前中断：索引多出向量，文本末尾留下半行
+    store.index.add(vectors[5:7])
+    faiss.write_index(store.index, store.faiss_path)
+    with open(store.texts_path, "ab") as f:
+        f.write(b'{"user_mess')
+
+    reloaded = make_store(index_type)
+    assert reloaded.index.ntotal == len(reloaded.records) == 5
+
+    reloaded.add_text("用户: new\n助手: x", vectors[7], _timestamp(7))
+    assert [memory.user_message for memory in reloaded.search(vectors[7], k=1)] == ["new"]
+    assert [memory.user_message for memory in reloaded.search(vectors[2], k=1)] == ["u2"]
+
+
+def test_unparseable_line_before_the_end_is_corruption(make_store, tmp_path):
+    store = make_store("flat")
+    _save_five(store)
+    lines = open(store.texts_path, "rb").read().splitlines()
+    lines[1] = b"garbage"
+    open(store.texts_path, "wb").write(b"\n".join(lines) + b"\n")
+
+    reloaded = make_store("flat")
+    assert reloaded.index.ntotal == len(reloaded.records) == 0
+    # 损坏的文件被改名保留，不会被新的空索引覆盖
+    assert len(list(tmp_path.glob("memory.jsonl.corrupt-*"))) == 1
+    assert len(list(tmp_path.glob("memory.faiss.corrupt-*"))) == 1
@@ -0,0 +1,139 @@
+import csv
+import io
+from contextlib import contextmanager
+from unittest import mock
+
+import pytest
+
+
+@pytest.fixture
+def cache(mysql_store):
+    return mysql_store._ConversationCache(maxsize=2, ttl=60)
+
+
+def test_conversation_cache_returns_copies(cache):
+    cache.put(1, {"id": 1, "settings": {"model": "a"}}, cache.generation)
+
+    cached = cache.get(1)
+    cached["settings"]["model"] = "b"
+    assert cache.get(1)["settings"] == {"model": "a"}
+
+
+def test_conversation_cache_rejects_stale_generation(cache):
+    generation = cache.generation
+    # 查询期间对话被写入，查询结果不能再放回缓存
+    cache.invalidate(1)
+    cache.put(1, {"id": 1}, generation)
+    assert cache.get(1) is None
+
+    cache.put(1, {"id": 1}, cache.generation)
+    assert cache.get(1) == {"id": 1}
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_conversation_cache_evicts_and_expires(mysql_store, cache):
+    for conversation_id in (1, 2):
+        cache.put(conversation_id, {"id": conversation_id}, cache.generation)
+    cache.get(1)
+    cache.put(3, {"id": 3}, cache.generation)
+    assert cache.get(2) is None
+    assert cache.get(1) == {"id": 1}
+
+    with mock.patch.object(mysql_store.time, "monotonic", return_value=mysql_store.time.monotonic() + 61):
+        assert cache.get(1) is None
+
+
+def test_conversation_cache_disabled_without_ttl(mysql_store):
+    cache = mysql_store._ConversationCache(maxsize=2, ttl=0)
+    cache.put(1, {"id": 1}, cache.generation)
+    assert cache.get(1) is None
+
+
+def test_write_messages_csv_escapes_for_load_data(mysql_store):
+    messages = [
+        {"timestamp": "t1", "user_message": 'say "hi", then\nleave', "ai_response": "C:\\path\\N",
+         "tokens_input": 3, "metadata": {"k": "v"}},
+        {"timestamp": "t2", "user_message": "plain", "ai_response": "ok"},
+    ]
+    buffer = io.StringIO(newline="")
+    mysql_store._write_messages_csv(buffer, 7, messages)
+    text = buffer.getvalue()
+
+    # 引号和反斜杠按 ESCAPED BY '\\' 转义，换行留在引号内，每行以 \n 结尾
+    assert '"say \\"hi\\", then\nleave"' in text
+    assert '"C:\\\\path\\\\N"' in text
+    assert text.endswith('"{}"\n')
+
+    rows = list(csv.reader(io.StringIO(text, newline=""), doublequote=False, escapechar="\\"))
+    assert rows == [
+        ["7", "t1", 'say "hi", then\nleave', "C:\\path\\N", "3", "0", "0", '{"k":"v"}'],
+        ["7", "t2", "plain", "ok", "0", "0", "0", "{}"],
+    ]
+
+
+def test_save_messages_skips_duplicate_timestamps_in_batch(mysql_store):
+    store = mysql_store.mysql_db
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = (1,)
+    cursor.rowcount = 2
+
+    @contextmanager
+    def session(dictionary=False, transaction=False):
+        yield mock.MagicMock(), cursor
+
+    messages = [
+        {"timestamp": "t1", "user_message": "u1", "ai_response": "a1"},
+        {"timestamp": "t1", "user_message": "duplicate", "ai_response": "duplicate"},
+        {"timestamp": "t2", "user_message": "u2", "ai_response": "a2"},
+    ]
+    with mock.patch.object(store, "_session", session):
+        assert store.save_messages(5, messages)
+
+    query, rows = cursor.executemany.call_args.args
+    assert [(row[1], row[2]) for row in rows] == [("t1", "u1"), ("t2", "u2")]
+    # 对话计数按实际插入的行数增加
+    assert cursor.execute.call_args.args[1] == (2, 5)
+
+
+def test_save_messages_checks_existing_timestamps_without_unique_key(mysql_store):
+    store = mysql_store.mysql_db
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = (1,)
+    cursor.fetchall.return_value = [("t1",)]
+    cursor.rowcount = 1
+
+    @contextmanager
+    def session(dictionary=False, transaction=False):
+        yield mock.MagicMock(), cursor
+
+    messages = [
+        {"timestamp": "t1", "user_message": "u1", "ai_response": "a1"},
+        {"timestamp": "t2", "user_message": "u2", "ai_response": "a2"},
+    ]
+    with mock.patch.object(store, "_session", session), mock.patch.object(store, "_unique_timestamps", False):
+        assert store.save_messages(5, messages)
+
+    query, rows = cursor.executemany.call_args.args
+    assert "ON DUPLICATE KEY UPDATE" in query and "IGNORE" not in query
+    assert [row[1] for row in rows] == ["t2"]
+
+
+def test_pool_overflow_is_bounded(mysql_store, override_settings):
+    store = mysql_store.mysql_db
+    override_settings(MYSQL_POOL_OVERFLOW=1, MYSQL_POOL_TIMEOUT=0.1)
+    pool = mock.MagicMock()
+    pool.get_connection.side_effect = mysql_store.PoolError
+    with mock.patch.object(store, "pool", pool), \
+            mock.patch.object(store, "_overflow", mysql_store.threading.BoundedSemaphore(1)), \
+            mock.patch.object(mysql_store.mysql.connector, "connect") as connect:
+        conn = store._get_connection()
+        # 名额用完后等待超时报错，而不是继续创建连接
+        with pytest.raises(mysql_store.PoolError):
+            store._get_connection()
+        assert connect.call_count == 1
+
+        conn.close()
+        conn.close()
+        store._get_connection()
+        assert connect.call_count == 2
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from utils.rwlock import RWLock
+
+
+def test_readers_share_the_lock():
+    lock = RWLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def reader():
+        with lock.read_lock():
+            # 三个读者必须同时持有读锁才能通过屏障
+            inside.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_writer_excludes_readers_and_writers():
+    lock = RWLock()
+    active = []
+    overlaps = []
+    guard = threading.Lock()
+
+    def enter(kind):
+        with guard:
+            if "w" in active or (kind == "w" and active):
+                overlaps.append((kind, list(active)))
+            active.append(kind)
+
+    def leave(kind):
+        with guard:
+            active.remove(kind)
+
+    def writer():
+        for _ in range(50):
+            with lock.write_lock():
+                enter("w")
+                time.sleep(0.0005)
+                leave("w")
+
+    def reader():
+        for _ in range(50):
+            with lock.read_lock():
+                enter("r")
+                time.sleep(0.0005)
+                leave("r")
+
+    threads = [threading.Thread(target=writer) for _ in range(2)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert overlaps == []
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = RWLock()
+    order = []
+    reader_holding = threading.Event()
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read_lock():
+            reader_holding.set()
+            release_reader.wait(5)
+        order.append("first reader")
+
+    def writer():
+        with lock.write_lock():
+            order.append("writer")
+
+    def late_reader():
+        with lock.read_lock():
+            order.append("late reader")
+
+    first = threading.Thread(target=first_reader)
+    first.start()
+    reader_holding.wait(5)
+    waiting_writer = threading.Thread(target=writer)
+    waiting_writer.start()
+    # 等写者进入等待队列后再启动新的读者
+    deadline = time.monotonic() + 5
+    while not lock._writers_waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+    late = threading.Thread(target=late_reader)
+    late.start()
+    time.sleep(0.05)
+    assert "late reader" not in order
+
+    release_reader.set()
+    for thread in (first, waiting_writer, late):
+        thread.join(5)
+    assert order.index("writer") < order.index("late reader")
@@ -19,6 +19,7 @@ sys.path.insert(0, parent_dir)
 
 from core.config import settings
 from utils.logger import get_logger, logger
+from db import schema
 
 # 创建专门的数据库日志
 db_logger = get_logger("db_init")
@@ -45,84 +46,26 @@ def init_mysql_database():
         
         db_logger.info(f"MySQL连接成功，尝试创建数据库: {db_name}")
         
-        # 检查数据库是否存在
-        cursor.execute(f"SHOW DATABASES LIKE '{db_name}'")
-        result = cursor.fetchone()
-        
-        if result:
-            db_logger.info(f"数据库 {db_name} 已存在")
-        else:
-            db_logger.info(f"创建数据库 {db_name}")
-            cursor.execute(f"CREATE DATABASE {db_name} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-            conn.commit()
+        if schema.create_database(cursor, db_name):
             db_logger.info(f"数据库 {db_name} 创建成功")
+        else:
+            db_logger.info(f"数据库 {db_name} 已存在")
         
         # 切换到新创建的数据库并初始化表
-        cursor.execute(f"USE {db_name}")
+        cursor.execute(f"USE {schema.quote_identifier(db_name)}")
         db_logger.info(f"切换到数据库 {db_name}")
         
         # 创建对话表
         db_logger.info("创建对话表")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                created_at DATETIME NOT NULL,
-                updated_at DATETIME NOT NULL,
-                settings JSON,
-                description TEXT
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """)
+        cursor.execute(schema.CONVERSATIONS_DDL)
         
         # 创建对话消息表
         db_logger.info("创建对话消息表")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversation_messages (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                conversation_id INT NOT NULL,
-                timestamp VARCHAR(50) NOT NULL,
-                user_message TEXT NOT NULL,
-                ai_response TEXT NOT NULL,
-                tokens_input INT,
-                tokens_output INT,
-                cost FLOAT,
-                created_at DATETIME NOT NULL,
-                metadata JSON,
-                INDEX (conversation_id, timestamp)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """)
+        cursor.execute(schema.CONVERSATION_MESSAGES_DDL)
         
-        # 添加外键约束
-        db_logger.info("添加外键约束")
-        try:
-            # 检查是否已存在约束
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM information_schema.TABLE_CONSTRAINTS 
-                WHERE CONSTRAINT_SCHEMA = %s 
-                AND CONSTRAINT_NAME = 'fk_conversation_id'
-            """, (db_name,))
-            
-            constraint_exists = cursor.fetchone()[0] > 0
-            
-            if constraint_exists:
-                db_logger.info("外键约束已存在，跳过添加")
-            else:
-                try:
-                    cursor.execute("""
-                        ALTER TABLE conversation_messages
-                        ADD CONSTRAINT fk_conversation_id
-                        FOREIGN KEY (conversation_id) REFERENCES conversations(id) 
-                        ON DELETE CASCADE
-                    """)
-                    db_logger.info("外键约束添加成功")
-                except mysql.connector.Error as err:
-                    if err.errno == errorcode.ER_MULTIPLE_PRI_KEY:
-                        db_logger.warning("外键约束已存在（通过错误检测），跳过")
-                    else:
-                        db_logger.error(f"添加外键约束失败: {str(err)}")
-        except Exception as e:
-            db_logger.error(f"检查外键约束状态失败: {str(e)}")
+        # 添加外键约束，并对旧版本创建的表补充计数列、唯一索引、二级索引和压缩行格式
+        schema.ensure_foreign_key(cursor, db_logger)
+        schema.migrate(cursor, db_logger)
         
         # 提交更改
         conn.commit()
@@ -0,0 +1,19 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时回退到标准库 json
+    orjson = None
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 编码的 JSON 字节串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    """解析 JSON，优先使用 orjson；格式错误时抛出 ValueError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
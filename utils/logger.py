@@ -2,10 +2,10 @@ import os
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
-from core.config import config
+from core.config import config, settings
 
 # 确保日志目录存在
-logs_dir = config.get("paths.logs_dir", "logs")
+logs_dir = settings.LOGS_DIR
 os.makedirs(logs_dir, exist_ok=True)
 
 # 创建日志记录器